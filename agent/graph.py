@@ -25,15 +25,16 @@ workflow.add_edge(START, "retrieve_data")
 workflow.add_edge("retrieve_data", "Supervisor")
 
 # Conditional edge from Supervisor
+def route_supervisor(state):
+    # Saving and summarizing are independent, so FINISH fans out to both in parallel
+    if state["next"] == "FINISH":
+        return ["save_conversation", "summarize_conversation"]
+    return state["next"]
+
 workflow.add_conditional_edges(
     "Supervisor",
-    lambda x: x["next"],
-    {
-        "Researcher": "Researcher",
-        "GeneralAssistant": "GeneralAssistant",
-        "NotionSearch": "NotionSearch",
-        "FINISH": "save_conversation",
-    },
+    route_supervisor,
+    ["Researcher", "GeneralAssistant", "NotionSearch", "tools", "save_conversation", "summarize_conversation"],
 )
 
 # Researcher flow
@@ -59,7 +60,7 @@ def route_notion(state):
 workflow.add_conditional_edges("NotionSearch", route_notion, {"Supervisor": "Supervisor", "GeneralAssistant": "GeneralAssistant"})
 
 # End flow
-workflow.add_edge("save_conversation", "summarize_conversation")
+workflow.add_edge("save_conversation", END)
 workflow.add_edge("summarize_conversation", END)
 
 graph = workflow.compile()
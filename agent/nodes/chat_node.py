@@ -1,51 +1,80 @@
-from datetime import datetime
+from functools import lru_cache
+from typing import Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from core.llm import get_llm
+from langchain_core.messages import AIMessage, message_chunk_to_message
+from core.llm import get_llm, extract_usage
+from core.cache import llm_response_cache, make_cache_key
 from agent.state import ChatState
+from agent.nodes.common_nodes import prompt_time, merge_token_usage
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+SYSTEM_INSTRUCTION = "IMPORTANT: Do not simulate the user. Do not generate 'User:' or 'Human:' dialogue."
+
+# Built once at import; persona and time are passed as inputs per call.
+# The time goes last so the persona/instruction prefix stays identical across
+# turns and can be served from provider prompt caches.
+_BASE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", "{persona}\n" + SYSTEM_INSTRUCTION),
+        MessagesPlaceholder(variable_name="messages"),
+        ("system", "Current Time: {time}"),
+    ]
+)
+
+
+@lru_cache(maxsize=8)
+def _chain_for(model_name: Optional[str]):
+    return _BASE_PROMPT | get_llm(model_name)
+
 
 async def general_assistant_node(state: ChatState):
-    llm = get_llm(state.get("model_name"))
-    
     persona_content = state.get("persona_content") or "You are a helpful AI assistant."
     messages = state["messages"]
-    
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", persona_content + f"\nIMPORTANT: Do not simulate the user. Do not generate 'User:' or 'Human:' dialogue.\nCurrent Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"),
-            MessagesPlaceholder(variable_name="messages"),
-        ]
+    current_time = prompt_time()
+
+    full_system_prompt = f"{persona_content}\n{SYSTEM_INSTRUCTION}\nCurrent Time: {current_time}"
+
+    # Everything the model sees is part of the key: the time (so time-sensitive answers
+    # are not replayed), speaker names, and the chat room (no reuse across rooms/users)
+    cache_key = make_cache_key(
+        state.get("model_name"),
+        state.get("chat_room_id"),
+        persona_content,
+        current_time,
+        [(m.type, m.content, getattr(m, "name", None)) for m in messages],
     )
-    
-    chain = prompt | llm
-    
-    prompt_val = prompt.format(messages=messages)
-    # Check if prompt_val is a list of messages or a string (it should be list of messages)
-    system_prompt_str = ""
-    if isinstance(prompt_val, list):
-         for m in prompt_val:
-             if m.type == "system":
-                 system_prompt_str += m.content + "\n"
-    elif hasattr(prompt_val, "to_messages"):
-         for m in prompt_val.to_messages():
-             if m.type == "system":
-                 system_prompt_str += m.content + "\n"
-    
-    # We can also just use the persona_content constructed above + instruction
-    full_system_prompt = persona_content + f"\nIMPORTANT: Do not simulate the user. Do not generate 'User:' or 'Human:' dialogue.\nCurrent Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    cached = llm_response_cache.get(cache_key)
+    if cached is not None:
+        logger.info("METRIC_RESPONSE_CACHE: GeneralAssistant hit")
+        return {
+            "messages": [cached],
+            **merge_token_usage(state),
+            "applied_system_prompt": full_system_prompt
+        }
 
-    response = await chain.ainvoke({"messages": messages})
-    
-    # Track token usage
-    input_tokens = state.get("input_tokens_used", 0)
-    output_tokens = state.get("output_tokens_used", 0)
+    # Stream so tokens reach graph.astream(stream_mode="messages") consumers as they arrive;
+    # the accumulated chunk becomes the final AIMessage stored in state.
+    accumulated = None
+    async for chunk in _chain_for(state.get("model_name")).astream(
+        {"persona": persona_content, "time": current_time, "messages": messages}
+    ):
+        accumulated = chunk if accumulated is None else accumulated + chunk
+    response = message_chunk_to_message(accumulated) if accumulated is not None else AIMessage(content="")
+    if response.content:
+        llm_response_cache[cache_key] = response
     
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        input_tokens += response.usage_metadata.get('input_tokens', 0)
-        output_tokens += response.usage_metadata.get('output_tokens', 0)
+    usage = extract_usage(response)
+    # Providers that cache the static prompt prefix report it here
+    if usage.cache_read or usage.cache_creation:
+        logger.info(
+            f"METRIC_PROMPT_CACHE: GeneralAssistant cache_read={usage.cache_read} "
+            f"cache_creation={usage.cache_creation}"
+        )
     
     return {
         "messages": [response],
-        "input_tokens_used": input_tokens,
-        "output_tokens_used": output_tokens,
+        **merge_token_usage(state, usage),
         "applied_system_prompt": full_system_prompt
     }
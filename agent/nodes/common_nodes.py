@@ -1,19 +1,64 @@
+import asyncio
 from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.documents import Document
-from core.llm import get_llm
-from repository.conversation_repository import get_history, add_message
+from core.llm import get_llm, extract_usage, TokenUsage
+from repository.conversation_repository import get_history, get_history_count, add_messages_batch
 from repository.chat_room_repository import get_chat_room_by_id, update_chat_room_summary
 from repository.persona_repository import get_persona_by_id
-from core.vector_store import get_vector_store
+from core.vector_store import get_index_queue
+from core.cache import summary_cache, make_cache_key
 from agent.state import ChatState
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Per-message cap so the summary prompt stays bounded
+SUMMARY_MESSAGE_MAX_CHARS = 1024
+# Below this much new text a summary round-trip is not worth it
+SUMMARY_MIN_TEXT_CHARS = 2000
+
+def prompt_time() -> str:
+    """Current time for the trailing prompt message; minute granularity keeps it stable within a turn."""
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+def merge_token_usage(state: ChatState, usage: TokenUsage = TokenUsage()) -> dict:
+    """State update adding `usage` to the turn's running token counters."""
+    return {
+        "input_tokens_used": (state.get("input_tokens_used") or 0) + usage.input_tokens,
+        "output_tokens_used": (state.get("output_tokens_used") or 0) + usage.output_tokens,
+    }
+
+def history_to_messages(history_tuples) -> list:
+    """Converts (role, message, name, applied_system_prompt) rows to LangChain messages."""
+    return [
+        HumanMessage(content=content, name=name) if role == "user" else AIMessage(content=content)
+        for role, content, name, _ in history_tuples
+    ]
+
+def build_prompt_prefix(summary, history_tuples) -> list:
+    """Summary + recent history messages that precede the turn's own messages in worker prompts."""
+    prefix = [SystemMessage(content=f"Previous conversation summary: {summary}")] if summary else []
+    prefix.extend(history_to_messages(history_tuples))
+    return prefix
+
+async def load_prompt_prefix(state: ChatState) -> list:
+    """Returns the turn's prompt prefix, rebuilding it if retrieve_data_node did not provide one."""
+    prefix = state.get("prompt_prefix")
+    if prefix is None:
+        history_tuples = state.get("history")
+        if history_tuples is None:
+            history_tuples = await get_history(state["chat_room_id"], limit=10)
+        prefix = build_prompt_prefix(state.get("summary"), history_tuples)
+    return prefix
+
 async def retrieve_data_node(state: ChatState):
     chat_room_id = state["chat_room_id"]
-    chat_room = await get_chat_room_by_id(chat_room_id)
+    # Recent history does not depend on the chat room row, so fetch it concurrently
+    chat_room, history = await asyncio.gather(
+        get_chat_room_by_id(chat_room_id),
+        get_history(chat_room_id, limit=10),
+    )
     
     persona_content = None
     summary = None
@@ -23,8 +68,18 @@ async def retrieve_data_node(state: ChatState):
             if persona:
                 persona_content = persona.content
         summary = chat_room.summary
+
+    # The turn's input message is located once here so later nodes can read it directly
+    user_message = next((m for m in state["messages"] if isinstance(m, HumanMessage)), None)
             
-    return {"persona_content": persona_content, "summary": summary}
+    return {
+        "persona_content": persona_content,
+        "summary": summary,
+        "history": history,
+        # Built once per turn; Supervisor and Researcher prepend it to their prompts
+        "prompt_prefix": build_prompt_prefix(summary, history),
+        "user_message": user_message,
+    }
 
 async def save_conversation_node(state: ChatState):
     user_id = state["user_id"]
@@ -34,12 +89,8 @@ async def save_conversation_node(state: ChatState):
     if not messages:
         return {}
         
-    # Find the first user message in this turn
-    user_message = None
-    for msg in messages:
-        if isinstance(msg, HumanMessage):
-            user_message = msg
-            break
+    # The first user message in this turn, resolved by retrieve_data_node
+    user_message = state.get("user_message")
             
     # Find the last AI message
     ai_message = messages[-1]
@@ -71,22 +122,22 @@ async def save_conversation_node(state: ChatState):
         # Get system prompt from state
         applied_system_prompt = state.get("applied_system_prompt")
         
-        await add_message(user_id, chat_room_id, "user", str(user_content))
-        await add_message(
-            user_id, 
-            chat_room_id, 
-            "assistant", 
-            str(ai_content),
-            model=model_name,
-            input_tokens=input_tokens if input_tokens > 0 else None,
-            output_tokens=output_tokens if output_tokens > 0 else None,
-            applied_system_prompt=applied_system_prompt
-        )
+        # User and assistant rows are written in one round-trip
+        await add_messages_batch(user_id, chat_room_id, [
+            {"role": "user", "message": str(user_content)},
+            {
+                "role": "assistant",
+                "message": str(ai_content),
+                "model": model_name,
+                "input_tokens": input_tokens if input_tokens > 0 else None,
+                "output_tokens": output_tokens if output_tokens > 0 else None,
+                "applied_system_prompt": applied_system_prompt,
+            },
+        ])
 
         # Index messages into vector store for RAG
+        # Embedding + upsert runs in the background indexer so it stays off the response path.
         try:
-            vector_store = get_vector_store(collection_name="conversation_history")
-            
             # Index user message
             user_doc = Document(
                 page_content=str(user_content),
@@ -109,12 +160,9 @@ async def save_conversation_node(state: ChatState):
                 }
             )
             
-            # Use run_in_executor to avoid async_mode error with GoogleGenerativeAIEmbeddings
-            # The async implementation of embeddings might be trying to use async client incorrectly
-            # Use aadd_documents for async indexing supported by PGVector
-            await vector_store.aadd_documents([user_doc, ai_doc])
+            await get_index_queue("conversation_history").put([user_doc, ai_doc])
         except Exception as e:
-            logger.error(f"Error indexing conversation: {e}")
+            logger.error(f"Error queueing conversation for indexing: {e}")
              
     return {}
 
@@ -123,10 +171,11 @@ async def summarize_conversation_node(state: ChatState):
     
     # Check if we need to summarize
     # Logic: If history length > N (e.g. 10), summarize.
-    # We need to fetch history to check length.
-    history_tuples = await get_history(chat_room_id, limit=100) # Fetch more to check total
+    # A COUNT query decides that; rows are only loaded when a summary is due.
+    history_count = await get_history_count(chat_room_id)
     
-    if len(history_tuples) > 10:
+    if history_count > 10:
+        history_tuples = await get_history(chat_room_id, limit=min(history_count, 100))
         llm = get_llm(state.get("model_name"))
         
         # Create summary prompt
@@ -135,8 +184,18 @@ async def summarize_conversation_node(state: ChatState):
         if not to_summarize:
             return {}
             
-        conversation_text = "\n".join([f"{name} ({role}): {content}" for role, content, name, _ in to_summarize])
+        conversation_text = "\n".join(
+            f"{name} ({role}): {content[:SUMMARY_MESSAGE_MAX_CHARS]}" for role, content, name, _ in to_summarize
+        )
+        if len(conversation_text) < SUMMARY_MIN_TEXT_CHARS:
+            return {}
+
         current_summary = state.get("summary", "")
+        cache_key = make_cache_key(current_summary, conversation_text)
+        cached_summary = summary_cache.get(cache_key)
+        if cached_summary is not None:
+            logger.info("METRIC_RESPONSE_CACHE: Summary hit")
+            return {"summary": cached_summary}
         
         prompt = f"""
         Summarize the following conversation concisely.
@@ -151,10 +210,15 @@ async def summarize_conversation_node(state: ChatState):
         try:
             response = await llm.ainvoke([HumanMessage(content=prompt)])
             new_summary = response.content
+            summary_cache[cache_key] = new_summary
             
             # Track token usage for logging purposes (not saved to conversation)
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                logger.info(f"Summary generation used {response.usage_metadata.get('input_tokens', 0)} input tokens and {response.usage_metadata.get('output_tokens', 0)} output tokens")
+            usage = extract_usage(response)
+            if usage.input_tokens or usage.output_tokens:
+                logger.info(
+                    f"Summary generation used {usage.input_tokens} input tokens and {usage.output_tokens} output tokens "
+                    f"(cache_read={usage.cache_read}, cache_creation={usage.cache_creation})"
+                )
             
             # Update DB
             await update_chat_room_summary(chat_room_id, new_summary)
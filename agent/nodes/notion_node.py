@@ -1,33 +1,89 @@
-import json
-from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Optional
 from agent.state import ChatState
 from llm.chains.notion_chain import notion_search_chain
 from langchain_core.messages import AIMessage
 from core.config import get_settings
-from core.notion_client import NotionClient
+from core.notion_client import get_notion_client
 from core.llm import get_llm
+from agent.nodes.common_nodes import prompt_time
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers.openai_functions import JsonOutputFunctionsParser
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
-from langchain_core.messages import AIMessage, HumanMessage
+NOTION_SYSTEM_PROMPT = (
+    "You are a smart assistant interacting with Notion.\n"
+    "Analyze the user's request and determine if they want to SEARCH, CREATE, or UPDATE a page.\n"
+    "If CREATE, extract the potential 'title' and 'content' for the page.\n"
+    "If UPDATE, you MUST provide the 'page_id'. If you don't know the 'page_id', SEARCH for the page first using 'search_notion'.\n"
+    "If SEARCH, extract the 'query'."
+)
+
+# Tool schemas are static, so they are declared once and bound once per model.
+NOTION_TOOLS = [
+    {
+        "name": "search_notion",
+        "description": "Search for pages in Notion",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search query"}
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "create_page",
+        "description": "Create a new page in Notion",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string", "description": "Title of the page"},
+                "content": {"type": "string", "description": "Content of the page (markdown supported)"}
+            },
+            "required": ["title", "content"]
+        }
+    },
+    {
+        "name": "update_page",
+        "description": "Update an existing Notion page (title or append content). REQUIRES valid page_id.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "page_id": {"type": "string", "description": "The exact ID of the page to update (e.g. 1b511319-56a4...)"},
+                "title": {"type": "string", "description": "New title for the page (optional)"},
+                "content": {"type": "string", "description": "Text content to append to the page (optional)"}
+            },
+            "required": ["page_id"]
+        }
+    }
+]
+
+# Static instructions first, per-call time and input last (prompt-cache friendly)
+_NOTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", NOTION_SYSTEM_PROMPT),
+    ("system", "Current Time: {time}"),
+    ("user", "{input}")
+])
+
+
+@lru_cache(maxsize=8)
+def _notion_chain(model_name: Optional[str]):
+    """Returns the intent-classification chain with the Notion tools bound for the given model."""
+    return _NOTION_PROMPT | get_llm(model_name).bind_tools(NOTION_TOOLS)
+
 
 async def notion_node(state: ChatState) -> Dict[str, Any]:
     """
     Node that searches Notion or creates a page based on user intent.
     """
-    logger.debug(f"NotionNode invoked with state keys: {list(state.keys())}")
+    logger.debug("NotionNode invoked with state keys: %s", list(state))
     messages = state["messages"]
     
-    # Find the last HumanMessage to understand the user's intent
-    last_user_message = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            last_user_message = msg.content
-            break
+    # The HumanMessage for this turn is resolved once by retrieve_data_node
+    user_message = state.get("user_message")
+    last_user_message = user_message.content if user_message else ""
             
     if not last_user_message:
         # Fallback if no human message found (unlikely)
@@ -36,66 +92,14 @@ async def notion_node(state: ChatState) -> Dict[str, Any]:
 
     model_name = state.get("model_name")
     
-    llm = get_llm(model_name)
-    
     # 1. Classify Intent and Extract Data
-    system_prompt = (
-        "You are a smart assistant interacting with Notion.\n"
-        "Analyze the user's request and determine if they want to SEARCH, CREATE, or UPDATE a page.\n"
-        "If CREATE, extract the potential 'title' and 'content' for the page.\n"
-        "If UPDATE, you MUST provide the 'page_id'. If you don't know the 'page_id', SEARCH for the page first using 'search_notion'.\n"
-        "If SEARCH, extract the 'query'.\n"
-        "Current Time: {time}"
-    )
-    
-    tools = [
-        {
-            "name": "search_notion",
-            "description": "Search for pages in Notion",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "Search query"}
-                },
-                "required": ["query"]
-            }
-        },
-        {
-            "name": "create_page",
-            "description": "Create a new page in Notion",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "title": {"type": "string", "description": "Title of the page"},
-                    "content": {"type": "string", "description": "Content of the page (markdown supported)"}
-                },
-                "required": ["title", "content"]
-            }
-        },
-        {
-            "name": "update_page",
-            "description": "Update an existing Notion page (title or append content). REQUIRES valid page_id.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "page_id": {"type": "string", "description": "The exact ID of the page to update (e.g. 1b511319-56a4...)"},
-                    "title": {"type": "string", "description": "New title for the page (optional)"},
-                    "content": {"type": "string", "description": "Text content to append to the page (optional)"}
-                },
-                "required": ["page_id"]
-            }
-        }
-    ]
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("user", "{input}")
-    ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    
-    chain = prompt | llm.bind_tools(tools)
+    chain = _notion_chain(model_name)
     
     try:
-        result = await chain.ainvoke({"input": last_user_message})
+        result = await chain.ainvoke({
+            "input": last_user_message,
+            "time": prompt_time(),
+        })
         tool_calls = result.tool_calls
         
         response_text = "I couldn't understand your request regarding Notion."
@@ -106,11 +110,11 @@ async def notion_node(state: ChatState) -> Dict[str, Any]:
             logger.info(f"Notion intent classified: {function_name}")
             args = tool_call["args"]
             
-            client = NotionClient()
+            client = get_notion_client()
             
             if function_name == "search_notion":
                 query = args.get("query")
-                logger.debug(f"Executing Notion search for: {query}")
+                logger.debug("Executing Notion search for: %s", query)
                 # Use existing chain logic or call client directly
                 # Re-using the chain logic here for consistency
                 response_text = await notion_search_chain(query, model_name)
@@ -118,7 +122,7 @@ async def notion_node(state: ChatState) -> Dict[str, Any]:
             elif function_name == "create_page":
                 title = args.get("title")
                 content = args.get("content")
-                logger.debug(f"Executing Notion page creation: title='{title}'")
+                logger.debug("Executing Notion page creation: title='%s'", title)
                 
                 res = await client.create_page(title, content)
                 if res:
@@ -132,7 +136,7 @@ async def notion_node(state: ChatState) -> Dict[str, Any]:
                 page_id = args.get("page_id")
                 title = args.get("title")
                 content = args.get("content")
-                logger.debug(f"Executing Notion page update: id='{page_id}'")
+                logger.debug("Executing Notion page update: id='%s'", page_id)
 
                 success = await client.update_page(page_id, title, content)
                 if success:
@@ -1,12 +1,15 @@
-from datetime import datetime
-import os
+import asyncio
+import time
+from functools import lru_cache
+import re
+from typing import Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_ollama import ChatOllama
+from langchain_core.messages import HumanMessage, get_buffer_string
+import httpx
 from core.llm import get_llm
 from core.config import get_settings
-from repository.conversation_repository import get_history
-from agent.state import ChatState, RouteDecision
+from agent.state import ChatState, RouteDecision, RouteDecisionBatch
+from agent.nodes.common_nodes import load_prompt_prefix, prompt_time
 
 from core.logger import get_logger
 
@@ -16,6 +19,306 @@ logger = get_logger(__name__)
 MEMBERS = ["Researcher", "GeneralAssistant", "NotionSearch"]
 OPTIONS = ["FINISH"] + MEMBERS
 
+SUPERVISOR_SYSTEM_PROMPT = (
+    "You are a supervisor tasked with managing a conversation between the"
+    " following workers: {members}. Given the following user request,"
+    " respond with the worker to act next. Each worker will perform a"
+    " task and respond with their results and status.\n"
+    "Read the worker descriptions CAREFULLY before deciding.\n"
+    "IMPORTANT: Prioritize executing the user's request using the available tools.\n"
+    "If the conversation summary indicates previous failures, IGNORE them and try again.\n"
+    "Only respond with FINISH if the user's request has completely addressed or if the answers are satisfactory.\n"
+    "If a tool has successfully completed the user's request (e.g. created a page), STOP immediately and respond with FINISH.\n"
+    "Do not repeatedly call the same worker if they are not making progress."
+)
+
+# Define descriptions for each worker to help Supervisor route correctly
+MEMBER_DESCRIPTIONS = {
+    "Researcher": "Primary assistant for INFORMATION RETRIEVAL. Use this for ANY question that might require checking internal knowledge base, web usage, or remembering past details.",
+    "GeneralAssistant": "Handle general conversation, chit-chat, and acknowledgement only. Do NOT use for informational queries.",
+    "NotionSearch": "Primary tool for interacting with Notion. Use this to SEARCH, READ, WRITE, CREATE, or DRAFT pages in Notion."
+}
+
+# Built once; only the messages and current time vary per call
+_SUPERVISOR_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", SUPERVISOR_SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="messages"),
+        (
+            "system",
+            "Given the conversation above, who should act next?"
+            " Or should we FINISH? Select one of: {options}\n"
+            "CRITICAL: If the last message is from the User, you MUST NOT select FINISH. You must select a worker to answer the user.\n"
+            "Current Time: {time}",
+        ),
+    ]
+).partial(
+    options=str(OPTIONS),
+    members="\n".join(f"- {name}: {desc}" for name, desc in MEMBER_DESCRIPTIONS.items()),
+)
+
+
+@lru_cache(maxsize=8)
+def _chain_for(model_name: Optional[str]):
+    """Structured-output routing chain for the given cloud model."""
+    return _SUPERVISOR_PROMPT | get_llm(model_name).with_structured_output(RouteDecision)
+
+
+@lru_cache(maxsize=4)
+def _get_local_llm(base_url: str, model: str, timeout: float):
+    """Local Ollama router client, built once so its keep-alive connection pool is reused."""
+    # Imported here so turns that never use the local router skip loading langchain_ollama
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(
+        base_url=base_url,
+        model=model,
+        temperature=0,
+        timeout=timeout,
+        async_client_kwargs={
+            "limits": httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        },
+    )
+
+
+@lru_cache(maxsize=4)
+def _local_chain_for(base_url: str, model: str, timeout: float):
+    """Structured-output routing chain for the local Ollama router."""
+    return _SUPERVISOR_PROMPT | _get_local_llm(base_url, model, timeout).with_structured_output(RouteDecision)
+
+
+# Short greetings/thanks that need no research (matched against the whole message)
+_GREETING = re.compile(
+    r"^\s*(?:(?:hi|hello|hey|thanks|thank you|good (?:morning|evening|night))\b|(?:안녕|고마워|감사)\S{0,5})[\s!.~?]*$",
+    re.IGNORECASE,
+)
+
+# Cheap keyword prefilter for obvious routes (Korean words take particles, so no \b there)
+_FAST_ROUTES = [
+    ("NotionSearch", re.compile(r"\bnotion\b|노션", re.IGNORECASE)),
+    ("Researcher", re.compile(r"\b(search|google|latest|news)\b|검색|뉴스|최신", re.IGNORECASE)),
+]
+
+
+def _fast_route(message) -> Optional[str]:
+    """Returns a worker for a user message that matches an unambiguous keyword, else None."""
+    if not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+        return None
+    if _GREETING.match(message.content):
+        return "GeneralAssistant"
+    for route, pattern in _FAST_ROUTES:
+        if pattern.search(message.content):
+            return route
+    return None
+
+
+def _short_circuit(messages) -> Optional[str]:
+    """Resolve the next step without the LLM when the answer is unambiguous.
+
+    Returns None when the decision genuinely needs the LLM classifier.
+    """
+    if not messages:
+        return "GeneralAssistant"
+
+    last_msg = messages[-1]
+    if last_msg.type == "tool":
+        # Tool results always go back to the worker that requested them
+        return "Researcher"
+    if last_msg.type == "ai":
+        # Pending tool calls must be executed; a plain answer ends the turn
+        return "tools" if last_msg.tool_calls else "FINISH"
+
+    return None
+
+
+# Several conversations routed in one call; the static instructions are shared
+_BATCH_SUPERVISOR_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", SUPERVISOR_SYSTEM_PROMPT),
+        (
+            "system",
+            "You are routing {count} independent conversations at once, each delimited by '### Conversation <n>'.\n"
+            "For EACH conversation, decide who should act next, or whether to FINISH. Select one of: {options}\n"
+            "CRITICAL: If the last message of a conversation is from the User, you MUST NOT select FINISH for it.\n"
+            "Return exactly {count} decisions, in the same order as the conversations.\n"
+            "Current Time: {time}",
+        ),
+        ("human", "{conversations}"),
+    ]
+).partial(
+    options=str(OPTIONS),
+    members="\n".join(f"- {name}: {desc}" for name, desc in MEMBER_DESCRIPTIONS.items()),
+)
+
+
+@lru_cache(maxsize=8)
+def _batch_chain_for(model_name: Optional[str]):
+    return _BATCH_SUPERVISOR_PROMPT | get_llm(model_name).with_structured_output(RouteDecisionBatch)
+
+
+class RouterBatcher:
+    """
+    Micro-batcher for cloud routing decisions.
+
+    Routing requests arriving within `max_wait` seconds of each other (up to
+    `max_batch`) are answered by a single structured-output LLM call. A batch
+    of one, or a batch whose answer does not line up with its requests, falls
+    back to the regular per-request chain.
+    """
+
+    def __init__(self, model_name: Optional[str], max_batch: int, max_wait: float):
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    async def submit(self, inputs: dict) -> RouteDecision:
+        """Queues one routing request and waits for its decision."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((inputs, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without blocking collection of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: list) -> None:
+        try:
+            if len(batch) == 1:
+                decisions = [await _chain_for(self.model_name).ainvoke(batch[0][0])]
+            else:
+                decisions = await self._invoke_batch([inputs for inputs, _ in batch])
+            for (_, future), decision in zip(batch, decisions):
+                if not future.done():
+                    future.set_result(decision)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _invoke_batch(self, batch_inputs: list) -> list:
+        conversations = "\n\n".join(
+            f"### Conversation {i}\n{get_buffer_string(inputs['messages'])}"
+            for i, inputs in enumerate(batch_inputs, 1)
+        )
+        result = await _batch_chain_for(self.model_name).ainvoke({
+            "count": len(batch_inputs),
+            "conversations": conversations,
+            "time": batch_inputs[0]["time"],
+        })
+        if result is not None and len(result.decisions) == len(batch_inputs):
+            logger.info(f"METRIC_ROUTER_BATCH: {len(batch_inputs)} decisions in one call")
+            return result.decisions
+
+        logger.warning("Batched routing returned a mismatched result. Falling back to per-request routing.")
+        chain = _chain_for(self.model_name)
+        return await asyncio.gather(*(chain.ainvoke(inputs) for inputs in batch_inputs))
+
+
+_router_batchers: dict = {}
+
+
+def get_router_batcher(model_name: Optional[str]) -> RouterBatcher:
+    """Returns the routing micro-batcher for a model, creating it on first use."""
+    batcher = _router_batchers.get(model_name)
+    if batcher is None:
+        agent = get_settings().agent
+        batcher = RouterBatcher(model_name, agent.router_max_batch, agent.router_batch_window)
+        _router_batchers[model_name] = batcher
+    return batcher
+
+
+# Local router circuit breaker: monotonic time until which the local arm is skipped
+_local_router_open_until = 0.0
+
+
+def _trip_local_breaker(error) -> None:
+    global _local_router_open_until
+    reset = get_settings().local_llm.circuit_breaker_reset
+    _local_router_open_until = time.monotonic() + reset
+    logger.warning(f"Local Router Failed, skipping it for {reset:.0f}s. Error: {error}")
+
+
+async def _hedged_route(inputs: dict, model_name: Optional[str]) -> RouteDecision:
+    """
+    Routes with the local LLM, hedged by the cloud LLM.
+
+    The local call starts first; if it has not produced a decision within
+    `hedge_delay` seconds (or fails), the cloud call starts and whichever
+    returns a valid decision first wins. The loser is cancelled.
+    """
+    local = get_settings().local_llm
+    cloud_chain = _chain_for(model_name)
+
+    if time.monotonic() < _local_router_open_until:
+        logger.debug("Local Router circuit open, using cloud router")
+        return await cloud_chain.ainvoke(inputs)
+
+    router_model = local.router_model or local.model
+    logger.info("Using Local Router: %s (%s)", local.base_url, router_model)
+    local_task = asyncio.create_task(
+        _local_chain_for(local.base_url, router_model, local.timeout).ainvoke(inputs)
+    )
+    tasks = [local_task]
+    try:
+        done, _ = await asyncio.wait({local_task}, timeout=local.hedge_delay)
+        if done:
+            if local_task.exception() is None and local_task.result() is not None:
+                return local_task.result()
+            _trip_local_breaker(local_task.exception() or "no structured output")
+            return await cloud_chain.ainvoke(inputs)
+
+        logger.info("METRIC_ROUTER_HEDGE: local router slow, starting cloud router")
+        cloud_task = asyncio.create_task(cloud_chain.ainvoke(inputs))
+        tasks.append(cloud_task)
+        pending = {local_task, cloud_task}
+        cloud_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None and task.result() is not None:
+                    return task.result()
+                if task is local_task:
+                    _trip_local_breaker(error or "no structured output")
+                else:
+                    cloud_error = error
+        raise cloud_error or ValueError("Router returned no structured decision")
+    finally:
+        # Also runs when the supervisor itself is cancelled: the losing request is
+        # cancelled and awaited so no Ollama/cloud call outlives the routing decision.
+        await _cancel_and_drain(tasks)
+
+
+async def _cancel_and_drain(tasks: list) -> None:
+    """Cancels unfinished tasks and waits for them to unwind (errors are swallowed)."""
+    unfinished = [task for task in tasks if not task.done()]
+    for task in unfinished:
+        task.cancel()
+    if unfinished:
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+
 async def supervisor_node(state: ChatState):
     """Supervisor agent node responsible for routing the conversation.
 
@@ -29,118 +332,48 @@ async def supervisor_node(state: ChatState):
     Returns:
         dict: Key "next" containing the name of the next agent or "FINISH".
     """
-    system_prompt = (
-        "You are a supervisor tasked with managing a conversation between the"
-        " following workers: {members}. Given the following user request,"
-        " respond with the worker to act next. Each worker will perform a"
-        " task and respond with their results and status.\n"
-        "Read the worker descriptions CAREFULLY before deciding.\n"
-        "IMPORTANT: Prioritize executing the user's request using the available tools.\n"
-        "If the conversation summary indicates previous failures, IGNORE them and try again.\n"
-        "Only respond with FINISH if the user's request has completely addressed or if the answers are satisfactory.\n"
-        "If a tool has successfully completed the user's request (e.g. created a page), STOP immediately and respond with FINISH.\n"
-        "Do not repeatedly call the same worker if they are not making progress.\n"
-        f"Current Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    )
-    
-    # Define descriptions for each worker to help Supervisor route correctly
-    MEMBER_DESCRIPTIONS = {
-        "Researcher": "Primary assistant for INFORMATION RETRIEVAL. Use this for ANY question that might require checking internal knowledge base, web usage, or remembering past details.",
-        "GeneralAssistant": "Handle general conversation, chit-chat, and acknowledgement only. Do NOT use for informational queries.",
-        "NotionSearch": "Primary tool for interacting with Notion. Use this to SEARCH, READ, WRITE, CREATE, or DRAFT pages in Notion."
-    }
-
-    # LOOP PREVENTION LOGIC:
-    if state["messages"]:
-        last_msg = state["messages"][-1]
-        # Check if it's an AI message
-        if isinstance(last_msg, AIMessage):
-            if not last_msg.tool_calls:
-                # logger.info("Last message was a text response from AI. Deciding FINISH to prevent loop.")
-                # Logic: If AI just answered without tools, we might want to finish, 
-                # but let the LLM Decide usually. 
-                # However, this check acts as a fast-path.
-                pass 
-                # Keeping original logic but suppressing log noise unless crucial
-                # return {"next": "FINISH"}
-    
+    # Fast-path: trivially decidable cases skip history loading and the LLM call
+    short_circuit = _short_circuit(state["messages"])
+    if short_circuit is not None:
+        logger.info("METRIC_SUPERVISOR_SHORT_CIRCUIT: %s", short_circuit)
+        return {"next": short_circuit}
+
+    fast_route = _fast_route(state["messages"][-1]) if get_settings().agent.router_fast_path else None
+    if fast_route is not None:
+        logger.info("METRIC_SUPERVISOR_FAST_ROUTE: %s", fast_route)
+        return {"next": fast_route}
+
     logger.info("METRIC_NODE_EXEC: Supervisor")
 
-    
-    # Create a string representation of members with their descriptions
-    members_with_descriptions = "\n".join([f"- {name}: {desc}" for name, desc in MEMBER_DESCRIPTIONS.items()])
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="messages"),
-            (
-                "system",
-                "Given the conversation above, who should act next?"
-                " Or should we FINISH? Select one of: {options}\n"
-                "CRITICAL: If the last message is from the User, you MUST NOT select FINISH. You must select a worker to answer the user.",
-            ),
-        ]
-    ).partial(options=str(OPTIONS), members=members_with_descriptions)
-    
-    # We need to construct messages including history and summary
-    messages = []
-    if state.get("summary"):
-        messages.append(SystemMessage(content=f"Previous conversation summary: {state['summary']}"))
-        
-    # Fetch recent history
-    chat_room_id = state["chat_room_id"]
-    history_tuples = await get_history(chat_room_id, limit=10)
-    for role, content, name, _ in history_tuples:
-        if role == "user":
-            messages.append(HumanMessage(content=content, name=name))
-        else:
-            messages.append(AIMessage(content=content))
-            
-    messages.extend(state["messages"])
+    # Summary + recent history are built once per turn by retrieve_data_node
+    messages = [*await load_prompt_prefix(state), *state["messages"]]
 
     # Hybrid Router Logic
     settings = get_settings()
-    result_decision = None
-
-    async def run_chain(llm_instance):
-         structured = llm_instance.with_structured_output(RouteDecision)
-         chain = prompt | structured
-         return await chain.ainvoke({"messages": messages})
-
-    if settings.local_llm.enabled:
-        try:
-            logger.info(f"Using Local Router: {settings.local_llm.base_url} ({settings.local_llm.model})")
-            # Set a generic base_url for Ollama.
-            local_llm = ChatOllama(
-                base_url=settings.local_llm.base_url,
-                model=settings.local_llm.model,
-                temperature=0,
-                timeout=settings.local_llm.timeout
-            )
-            result_decision = await run_chain(local_llm)
-        except Exception as e:
-            logger.warning(f"Local Router Failed, falling back to Gemini. Error: {e}")
-            result_decision = None
+    inputs = {"messages": messages, "time": prompt_time()}
 
-    if result_decision is None:
-        # Fallback to Gemini
-        try:
-            llm = get_llm(state.get("model_name"))
-            result_decision = await run_chain(llm)
-        except Exception as e:
-            logger.error(f"Supervisor failed: {e}")
-            return {"next": "GeneralAssistant"}
+    try:
+        if settings.local_llm.enabled:
+            result_decision = await _hedged_route(inputs, state.get("model_name"))
+        elif settings.agent.router_batching:
+            result_decision = await get_router_batcher(state.get("model_name")).submit(inputs)
+        else:
+            result_decision = await _chain_for(state.get("model_name")).ainvoke(inputs)
+        if result_decision is None:
+            raise ValueError("Router returned no structured decision")
+    except Exception as e:
+        logger.error("Supervisor failed: %s", e)
+        return {"next": "GeneralAssistant"}
 
     next_step = result_decision.next_agent
 
-    logger.info(f"Supervisor decided next step: {next_step} (Reason: {result_decision.reasoning})")
+    logger.info("Supervisor decided next step: %s (Reason: %s)", next_step, result_decision.reasoning)
 
     # Debug Logging
     if state["messages"]:
         last_msg = state["messages"][-1]
-        logger.debug(f"Last message content: {last_msg.content[:100] if last_msg.content else 'None'}...")
-        logger.debug(f"Supervisor routing to: {next_step}")
+        logger.debug("Last message content: %.100s...", last_msg.content or "None")
+        logger.debug("Supervisor routing to: %s", next_step)
 
         # ROBUST FAIL-SAFE:
         if next_step == "FINISH" and isinstance(last_msg, HumanMessage):
@@ -148,24 +381,4 @@ async def supervisor_node(state: ChatState):
             next_step = "Researcher"
             return {"next": next_step}
 
-    # Loop Detection Logic
-    last_messages = state["messages"][-10:]
-    ai_messages = [m.content for m in last_messages if isinstance(m, AIMessage)]
-
-    if len(ai_messages) >= 3:
-        # Check for exact matches
-        if ai_messages[-1] == ai_messages[-2] == ai_messages[-3]:
-            logger.warning("Loop detected: Last 3 AI messages are identical. Forcing FINISH.")
-            return {"next": "FINISH"}
-
-        # Check for Notion page creation loop
-        if ("Successfully created Notion page" in ai_messages[-1] or "Successfully updated Notion page" in ai_messages[-1]) and next_step == "NotionSearch":
-            logger.warning("Loop detected: Repeated Notion page operation attempt. Forcing FINISH.")
-            return {"next": "FINISH"}
-
-        if len(ai_messages) >= 4:
-            if ai_messages[-1] == ai_messages[-3] and ai_messages[-2] == ai_messages[-4]:
-                    logger.warning("Loop detected: Alternating messages detected. Forcing FINISH.")
-                    return {"next": "FINISH"}
-
     return {"next": next_step}
@@ -1,17 +1,52 @@
-from datetime import datetime
+from functools import lru_cache
+from typing import Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
-from core.llm import get_llm
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from core.llm import get_llm, extract_usage
 from core.logger import get_logger
 
 logger = get_logger(__name__)
-from tools.search_tool import get_search_tool
-from tools.retrieval_tool import get_retrieval_tool
-from tools.memory_tool import get_memory_tool
-from tools.time_tool import get_time_tool
-from repository.conversation_repository import get_history
+from agent.nodes.tools_node import get_tools
+from agent.nodes.common_nodes import load_prompt_prefix, prompt_time, merge_token_usage
 from agent.state import ChatState
 
+RESEARCHER_SYSTEM_PROMPT = (
+    "You are a research agent with access to search tools and a time tool.\n"
+    "For every user question, you MUST use tools to find information.\n"
+    "Workflow:\n"
+    "1) First, search using `search_internal_knowledge`.\n"
+    "2) If results are missing or insufficient, use `tavily_search` (web search).\n"
+    "3) Summarize the findings and answer clearly.\n"
+    "4) Always cite sources when using `search_internal_knowledge`.\n"
+    "Tool Usage Guidelines:\n"
+    "- For 'today's news' or 'latest updates', set `time_range='day'` in `tavily_search`.\n"
+    "- Avoid using `start_date` or `end_date` unless strictly necessary (format: YYYY-MM-DD).\n"
+    "- If a search fails, retry with fewer parameters (e.g. just `query`).\n"
+    "Do NOT rely on internal knowledge alone.\n"
+    "Do NOT simulate user dialogue."
+)
+
+# Built once at import and also recorded as applied_system_prompt; the current time is a trailing message so the static prefix stays cacheable
+_RESEARCHER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", RESEARCHER_SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="messages"),
+        ("system", "Current time: {time}"),
+    ]
+)
+
+@lru_cache(maxsize=256)
+def _researcher_chain(model_name: Optional[str], chat_room_id: Optional[str], force_retrieval: bool):
+    """Prompt piped into the LLM bound to the chat room's tools, cached per combination."""
+    tools = list(get_tools(chat_room_id))
+    llm = get_llm(model_name)
+    if force_retrieval:
+        # Force the specific tool
+        return _RESEARCHER_PROMPT | llm.bind_tools(tools, tool_choice="search_internal_knowledge")
+    # Auto mode for subsequent turns (e.g. after tool execution)
+    return _RESEARCHER_PROMPT | llm.bind_tools(tools)
+
+
 async def researcher_node(state: ChatState):
     """Researcher agent node responsible for information retrieval.
     
@@ -27,68 +62,24 @@ async def researcher_node(state: ChatState):
         dict: A dictionary containing the updated messages, token usage stats, 
             and the applied system prompt.
     """
-    llm = get_llm(state.get("model_name"))
-    search_tool = get_search_tool()
     chat_room_id = state.get("chat_room_id")
-    retrieval_tool = get_retrieval_tool(chat_room_id=str(chat_room_id) if chat_room_id else None)
-    memory_tool = get_memory_tool()
-    time_tool = get_time_tool()
-    tools = [search_tool, retrieval_tool, memory_tool, time_tool]
-    
-    # Researcher agent
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are a research agent with access to search tools and a time tool.\n"
-                "For every user question, you MUST use tools to find information.\n"
-                "Workflow:\n"
-                "1) First, search using `search_internal_knowledge`.\n"
-                "2) If results are missing or insufficient, use `tavily_search` (web search).\n"
-                "3) Summarize the findings and answer clearly.\n"
-                "4) Always cite sources when using `search_internal_knowledge`.\n"
-                "Tool Usage Guidelines:\n"
-                "- For 'today's news' or 'latest updates', set `time_range='day'` in `tavily_search`.\n"
-                "- Avoid using `start_date` or `end_date` unless strictly necessary (format: YYYY-MM-DD).\n"
-                "- If a search fails, retry with fewer parameters (e.g. just `query`).\n"
-                "Do NOT rely on internal knowledge alone.\n"
-                "Do NOT simulate user dialogue.\n"
-                f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            ),
-            MessagesPlaceholder(variable_name="messages"),
-        ]
-    )
-    
+
     # Determine forcing strategy (Method B)
     # If the last message is from the user, we FORCE the usage of the retrieval tool.
     # This prevents the AI from answering from memory.
     last_message = state["messages"][-1]
     force_retrieval = isinstance(last_message, HumanMessage)
+    chain = _researcher_chain(
+        state.get("model_name"),
+        str(chat_room_id) if chat_room_id else None,
+        force_retrieval,
+    )
     
-    if force_retrieval:
-        # Force the specific tool
-        chain = prompt | llm.bind_tools(tools, tool_choice="search_internal_knowledge")
-    else:
-        # Auto mode for subsequent turns (e.g. after tool execution)
-        chain = prompt | llm.bind_tools(tools)
-    
-    # Construct messages including history and summary
-    messages = []
-    if state.get("summary"):
-        messages.append(SystemMessage(content=f"Previous conversation summary: {state['summary']}"))
-        
-    # Fetch recent history
-    chat_room_id = state["chat_room_id"]
-    history_tuples = await get_history(chat_room_id, limit=10)
-    for role, content, name, _ in history_tuples:
-        if role == "user":
-            messages.append(HumanMessage(content=content, name=name))
-        else:
-            messages.append(AIMessage(content=content))
-            
-    messages.extend(state["messages"])
+    # Summary + recent history are built once per turn by retrieve_data_node
+    messages = [*await load_prompt_prefix(state), *state["messages"]]
     
-    response = await chain.ainvoke({"messages": messages})
+    current_time = prompt_time()
+    response = await chain.ainvoke({"messages": messages, "time": current_time})
 
     # FALLBACK LOGIC: If LLM returns empty response after retrieval failure, force Google Search
     if not response.content and not response.tool_calls:
@@ -113,27 +104,10 @@ async def researcher_node(state: ChatState):
                  response = AIMessage(content="", tool_calls=[fallback_tool_call])
 
     # Capture system prompt
-    full_system_prompt = (
-        "You are a Researcher. You have access to search tools and a time tool."
-        " Use them to find information requested by the user."
-        " If you have found the information, summarize it and answer the user.\n"
-        "IMPORTANT: If the user asks for ANY information, you MUST use the provided tools (search_internal_knowledge or search_google) to find it. Do not rely on your internal knowledge alone.\n"
-        "IMPORTANT: When using the 'search_internal_knowledge' tool, you MUST cite the source of the information in your response. The tool output provides the source (e.g., 'Source: ...'). Append the source at the end of your answer.\n"
-        "IMPORTANT: Do not simulate the user. Do not generate 'User:' or 'Human:' dialogue.\n"
-        f"Current Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    )
-    
-    # Track token usage
-    input_tokens = state.get("input_tokens_used", 0)
-    output_tokens = state.get("output_tokens_used", 0)
-    
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        input_tokens += response.usage_metadata.get('input_tokens', 0)
-        output_tokens += response.usage_metadata.get('output_tokens', 0)
-    
+    full_system_prompt = f"{RESEARCHER_SYSTEM_PROMPT}\nCurrent time: {current_time}"
+
     return {
         "messages": [response],
-        "input_tokens_used": input_tokens,
-        "output_tokens_used": output_tokens,
+        **merge_token_usage(state, extract_usage(response)),
         "applied_system_prompt": full_system_prompt
     }
@@ -1,25 +1,44 @@
+from functools import lru_cache
+from typing import Optional
 from agent.state import ChatState
 from tools.search_tool import get_search_tool
 from tools.retrieval_tool import get_retrieval_tool
 from tools.memory_tool import get_memory_tool
 from tools.time_tool import get_time_tool
 
+
+@lru_cache(maxsize=256)
+def get_tools(chat_room_id: Optional[str] = None) -> tuple:
+    """
+    Returns the Researcher's tool set, with retrieval scoped to the chat room.
+    Built lazily (not at import) to avoid database connections during module import.
+    """
+    return (
+        get_search_tool(),
+        get_retrieval_tool(chat_room_id=chat_room_id),
+        get_memory_tool(),
+        get_time_tool(),
+    )
+
+
+@lru_cache(maxsize=256)
+def _tool_executor(chat_room_id: Optional[str] = None):
+    from langgraph.prebuilt import ToolNode
+
+    return ToolNode(list(get_tools(chat_room_id)))
+
+
 # Define a custom tools node that lazily initializes tools
 async def tools_node(state: ChatState):
     """
     Custom tools node that initializes tools at runtime to avoid
     database connection during module import.
+
+    The ToolNode is cached per chat room, and it executes the same
+    chat-room-scoped tools the Researcher was bound with.
     """
-    from langgraph.prebuilt import ToolNode
-    
-    # Initialize tools at runtime
-    search_tool = get_search_tool()
-    retrieval_tool = get_retrieval_tool()
-    memory_tool = get_memory_tool()
-    time_tool = get_time_tool()
-    
-    # Create ToolNode with initialized tools
-    tool_executor = ToolNode([search_tool, retrieval_tool, memory_tool, time_tool])
-    
+    chat_room_id = state.get("chat_room_id")
+    tool_executor = _tool_executor(str(chat_room_id) if chat_room_id else None)
+
     # Execute the tools
     return await tool_executor.ainvoke(state)
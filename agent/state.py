@@ -1,15 +1,30 @@
-from typing import Annotated, List, Optional, Literal
+from typing import Annotated, List, Optional, Literal, Tuple
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+# Choices offered to the routing LLM
+RouteTarget = Literal["Researcher", "GeneralAssistant", "NotionSearch", "FINISH"]
+# Values of ChatState.next: also "tools" (fast path) and "" (not yet routed)
+NextStep = Literal["Researcher", "GeneralAssistant", "NotionSearch", "FINISH", "tools", ""]
 
 class RouteDecision(BaseModel):
-    next_agent: Literal["Researcher", "GeneralAssistant", "NotionSearch", "FINISH"] = Field(
+    # Immutable and tolerant of extra keys some models emit alongside the schema
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    next_agent: RouteTarget = Field(
         description="The next agent to act of FINISH."
     )
     reasoning: str = Field(description="The reasoning behind the decision.")
 
+class RouteDecisionBatch(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    decisions: List[RouteDecision] = Field(
+        description="One routing decision per conversation, in the same order as the conversations."
+    )
+
 class ChatState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     user_id: str
@@ -17,7 +32,10 @@ class ChatState(TypedDict):
     persona_content: Optional[str]
     model_name: Optional[str]
     summary: Optional[str]
-    next: str
+    user_message: Optional[BaseMessage]  # The HumanMessage that started this turn, resolved once in retrieve_data_node
+    history: Optional[List[Tuple[str, str, str, Optional[str]]]]  # Recent (role, message, name, applied_system_prompt) rows, loaded once per turn
+    prompt_prefix: Optional[List[BaseMessage]]  # Summary + history messages prepended to worker prompts, built once per turn
+    next: NextStep
     input_tokens_used: Optional[int]
     output_tokens_used: Optional[int]
     applied_system_prompt: Optional[str]
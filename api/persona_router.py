@@ -1,34 +1,70 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Body, Depends
-from pydantic import BaseModel
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from repository.persona_repository import (
     create_persona,
-    get_persona_by_id,
+    get_persona_for_telegram_user,
     get_user_personas,
     update_persona,
     delete_persona,
     get_public_personas,
 )
-from repository.chat_room_repository import set_chat_room_persona
+from repository.chat_room_repository import (
+    set_chat_room_persona,
+    get_chat_room_by_id,
+    is_participant,
+)
+from repository.user_repository import get_user_by_telegram_id
+from repository.evaluation_repository import create_evaluation, get_persona_evaluations
+from core.config import get_settings
 from core.security import get_current_user_required
 
 
 router = APIRouter()
 
+settings = get_settings()
+
+# 공개 Persona 목록 캐시: limit -> (직렬화된 JSON bytes, ETag). 웹 UI 등 다른 경로의 변경은 TTL로 반영
+PUBLIC_LIST_TTL = 15
+_public_personas_cache: TTLCache = TTLCache(maxsize=16, ttl=PUBLIC_LIST_TTL)
+
+
+# 입력 크기 제한 (필드 길이는 pydantic-core가 파싱 단계에서 검사)
+PERSONA_NAME_MAX_LENGTH = 200
+PERSONA_CONTENT_MAX_LENGTH = 8000
+PERSONA_DESCRIPTION_MAX_LENGTH = 2000
+PERSONA_BODY_MAX_BYTES = 16_384
+
+
+def limit_body_size(max_bytes: int):
+    """Content-Length가 max_bytes를 넘는 요청을 본문 파싱 전에 413으로 거절하는 의존성"""
+    def dependency(request: Request) -> None:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise HTTPException(status_code=413, detail="Request body too large")
+    return dependency
+
 
 # Request/Response 모델
 class PersonaCreate(BaseModel):
-    name: str
-    content: str
-    description: Optional[str] = None
+    name: str = Field(..., max_length=PERSONA_NAME_MAX_LENGTH)
+    content: str = Field(..., max_length=PERSONA_CONTENT_MAX_LENGTH)
+    description: Optional[str] = Field(None, max_length=PERSONA_DESCRIPTION_MAX_LENGTH)
     is_public: bool = False
 
 
 class PersonaUpdate(BaseModel):
-    name: Optional[str] = None
-    content: Optional[str] = None
-    description: Optional[str] = None
+    name: Optional[str] = Field(None, max_length=PERSONA_NAME_MAX_LENGTH)
+    content: Optional[str] = Field(None, max_length=PERSONA_CONTENT_MAX_LENGTH)
+    description: Optional[str] = Field(None, max_length=PERSONA_DESCRIPTION_MAX_LENGTH)
     is_public: Optional[bool] = None
 
 
@@ -39,11 +75,53 @@ class PersonaResponse(BaseModel):
     content: str
     description: Optional[str]
     is_public: bool
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# 자주 발생하는 404 응답 본문 (core.exceptions의 HTTPException 핸들러와 같은 형식, 미리 직렬화)
+_PERSONA_NOT_FOUND = orjson.dumps({"error": "http_error", "detail": "Persona not found"})
+_PERSONA_NOT_FOUND_OR_DENIED = orjson.dumps(
+    {"error": "http_error", "detail": "Persona not found or permission denied"}
+)
 
-    class Config:
-        from_attributes = True
+
+def _not_found(body: bytes) -> Response:
+    """예외 처리 경로를 거치지 않는 404 응답"""
+    return Response(content=body, status_code=404, media_type="application/json")
+
+
+def _model_response(model: BaseModel) -> Response:
+    """모델을 pydantic-core로 바로 JSON 직렬화한 응답 (jsonable_encoder 생략)"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
+def _persona_to_dict(persona) -> Dict[str, Any]:
+    """Persona ORM 객체를 PersonaResponse와 같은 모양의 dict로 변환합니다 (datetime은 직렬화 단계에서 ISO 문자열로 변환)."""
+    return {
+        "id": str(persona.id),
+        "user_id": str(persona.user_id),
+        "name": persona.name,
+        "content": persona.content,
+        "description": persona.description,
+        "is_public": persona.is_public,
+        "created_at": persona.created_at,
+        "updated_at": persona.updated_at,
+    }
+
+
+def _evaluation_to_dict(evaluation) -> Dict[str, Any]:
+    """PersonaEvaluation ORM 객체를 EvaluationResponse와 같은 모양의 dict로 변환합니다."""
+    return {
+        "id": str(evaluation.id),
+        "persona_id": str(evaluation.persona_id),
+        "user_id": str(evaluation.user_id),
+        "score": evaluation.score,
+        "comment": evaluation.comment,
+        "created_at": evaluation.created_at,
+    }
 
 
 class ChatRoomPersonaSet(BaseModel):
@@ -61,13 +139,17 @@ class EvaluationResponse(BaseModel):
     user_id: str
     score: int
     comment: Optional[str]
-    created_at: str
+    created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-@router.post("/", response_model=PersonaResponse)
+@router.post(
+    "/",
+    response_model=None,
+    responses={200: {"model": PersonaResponse}},
+    dependencies=[Depends(limit_body_size(PERSONA_BODY_MAX_BYTES))],
+)
 async def create_persona_endpoint(
     persona: PersonaCreate = Body(...),
     current_user: Dict[str, Any] = Depends(get_current_user_required),
@@ -92,8 +174,6 @@ async def create_persona_endpoint(
         # 편의상 여기서는 repository가 telegram_id를 처리할 수 있도록 하거나,
         # security에서 DB User를 가져오도록 개선해야 함.
         # Convert Telegram ID to User UUID
-        from repository.user_repository import get_user_by_telegram_id
-
         db_user = await get_user_by_telegram_id(int(current_user["id"]))
         if not db_user:
             raise HTTPException(status_code=400, detail="User not found in database")
@@ -106,29 +186,21 @@ async def create_persona_endpoint(
             description=persona.description,
             is_public=persona.is_public,
         )
-        return PersonaResponse(
-            id=str(created.id),
-            user_id=str(created.user_id),
-            name=created.name,
-            content=created.content,
-            description=created.description,
-            is_public=created.is_public,
-            created_at=created.created_at.isoformat(),
-            updated_at=created.updated_at.isoformat(),
-        )
+        _public_personas_cache.clear()
+        return _model_response(PersonaResponse.model_construct(**_persona_to_dict(created)))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{persona_id}", response_model=PersonaResponse)
+@router.get("/{persona_id}", response_model=None, responses={200: {"model": PersonaResponse}})
 async def get_persona_endpoint(
-    persona_id: str,
+    persona_id: uuid.UUID,
     current_user: Dict[str, Any] = Depends(get_current_user_required),
 ):
     """Retrieve a Persona by ID.
 
     Args:
-        persona_id (str): The unique identifier of the persona.
+        persona_id (uuid.UUID): The unique identifier of the persona.
         current_user (Dict[str, Any]): The authenticated user.
 
     Returns:
@@ -137,28 +209,16 @@ async def get_persona_endpoint(
     Raises:
         HTTPException: If the persona is not found.
     """
-    from repository.user_repository import get_user_by_telegram_id
-    
-    db_user = await get_user_by_telegram_id(int(current_user["id"]))
-    user_uuid = db_user.id if db_user else None
-
-    persona = await get_persona_by_id(persona_id=persona_id, user_id=user_uuid)
+    persona = await get_persona_for_telegram_user(
+        persona_id=persona_id, telegram_id=int(current_user["id"])
+    )
     if not persona:
-        raise HTTPException(status_code=404, detail="Persona not found")
+        return _not_found(_PERSONA_NOT_FOUND)
     
-    return PersonaResponse(
-        id=str(persona.id),
-        user_id=str(persona.user_id),
-        name=persona.name,
-        content=persona.content,
-        description=persona.description,
-        is_public=persona.is_public,
-        created_at=persona.created_at.isoformat(),
-        updated_at=persona.updated_at.isoformat(),
-    )
+    return _model_response(PersonaResponse.model_construct(**_persona_to_dict(persona)))
 
 
-@router.get("/user/me", response_model=List[PersonaResponse])
+@router.get("/user/me", response_model=None, responses={200: {"model": List[PersonaResponse]}})
 async def get_my_personas_endpoint(
     current_user: Dict[str, Any] = Depends(get_current_user_required),
 ):
@@ -170,40 +230,30 @@ async def get_my_personas_endpoint(
     Returns:
         List[PersonaResponse]: A list of personas owned by the user.
     """
-    from repository.user_repository import get_user_by_telegram_id
-    
     db_user = await get_user_by_telegram_id(int(current_user["id"]))
     if not db_user:
-        return []
+        return ORJSONResponse([])
     user_uuid = db_user.id
 
     personas = await get_user_personas(user_id=user_uuid, include_public=True)
-    return [
-        PersonaResponse(
-            id=str(p.id),
-            user_id=str(p.user_id),
-            name=p.name,
-            content=p.content,
-            description=p.description,
-            is_public=p.is_public,
-            created_at=p.created_at.isoformat(),
-            updated_at=p.updated_at.isoformat(),
-        )
-        for p in personas
-    ]
+    # 목록은 dict로 만들어 바로 직렬화 (response_model 검증/jsonable_encoder 생략)
+    return ORJSONResponse([_persona_to_dict(p) for p in personas])
 
 
-@router.put("/{persona_id}", response_model=PersonaResponse)
+@router.put(
+    "/{persona_id}",
+    response_model=None,
+    responses={200: {"model": PersonaResponse}},
+    dependencies=[Depends(limit_body_size(PERSONA_BODY_MAX_BYTES))],
+)
 async def update_persona_endpoint(
-    persona_id: str,
+    persona_id: uuid.UUID,
     persona_update: PersonaUpdate = Body(...),
     current_user: Dict[str, Any] = Depends(get_current_user_required),
 ):
     """
     Persona 수정 (소유자만 가능)
     """
-    from repository.user_repository import get_user_by_telegram_id
-    
     db_user = await get_user_by_telegram_id(int(current_user["id"]))
     if not db_user:
          raise HTTPException(status_code=404, detail="User not found")
@@ -219,61 +269,51 @@ async def update_persona_endpoint(
     )
     
     if not updated:
-        raise HTTPException(status_code=404, detail="Persona not found or permission denied")
+        return _not_found(_PERSONA_NOT_FOUND_OR_DENIED)
     
-    return PersonaResponse(
-        id=str(updated.id),
-        user_id=str(updated.user_id),
-        name=updated.name,
-        content=updated.content,
-        description=updated.description,
-        is_public=updated.is_public,
-        created_at=updated.created_at.isoformat(),
-        updated_at=updated.updated_at.isoformat(),
-    )
+    _public_personas_cache.clear()
+    return _model_response(PersonaResponse.model_construct(**_persona_to_dict(updated)))
 
 
 @router.delete("/{persona_id}")
 async def delete_persona_endpoint(
-    persona_id: str,
+    persona_id: uuid.UUID,
     current_user: Dict[str, Any] = Depends(get_current_user_required),
 ):
     """
     Persona 삭제 (소유자만 가능)
     """
-    from repository.user_repository import get_user_by_telegram_id
-    
     db_user = await get_user_by_telegram_id(int(current_user["id"]))
     if not db_user:
          raise HTTPException(status_code=404, detail="User not found")
     user_uuid = db_user.id
 
     success = await delete_persona(persona_id=persona_id, user_id=user_uuid)
+    _public_personas_cache.clear()
     if not success:
-        raise HTTPException(status_code=404, detail="Persona not found or permission denied")
+        return _not_found(_PERSONA_NOT_FOUND_OR_DENIED)
     
     return {"message": "Persona deleted successfully"}
 
 
-@router.get("/public/list", response_model=List[PersonaResponse])
-async def get_public_personas_endpoint(limit: int = 50):
+@router.get("/public/list", response_model=None, responses={200: {"model": List[PersonaResponse]}})
+async def get_public_personas_endpoint(request: Request, limit: int = 50):
     """
-    공개 Persona 목록 조회
+    공개 Persona 목록 조회 (직렬화 결과를 짧게 캐시, ETag로 재검증 지원)
     """
-    personas = await get_public_personas(limit=limit)
-    return [
-        PersonaResponse(
-            id=str(p.id),
-            user_id=str(p.user_id),
-            name=p.name,
-            content=p.content,
-            description=p.description,
-            is_public=p.is_public,
-            created_at=p.created_at.isoformat(),
-            updated_at=p.updated_at.isoformat(),
-        )
-        for p in personas
-    ]
+    cached = _public_personas_cache.get(limit)
+    if cached is None:
+        personas = await get_public_personas(limit=limit)
+        # 목록은 dict로 만들어 바로 직렬화 (response_model 검증/jsonable_encoder 생략)
+        body = orjson.dumps([_persona_to_dict(p) for p in personas])
+        cached = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        _public_personas_cache[limit] = cached
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={PUBLIC_LIST_TTL}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/chat-room/{chat_room_id}/persona")
@@ -285,49 +325,35 @@ async def set_chat_room_persona_endpoint(
     """
     채팅방에 Persona 설정
     """
-    # Verify chat room ownership
-    from repository.chat_room_repository import get_chat_room_by_id
-    from repository.conversation_repository import get_history
-    from core.config import get_settings
-
-    settings = get_settings()
     user_telegram_id = int(current_user["id"])
 
-    # Get chat room
-    chat_room = await get_chat_room_by_id(chat_room_id)
-    if not chat_room:
-        raise HTTPException(status_code=404, detail="Chat room not found")
+    # Admins may modify any chat room: skip the ownership lookups entirely
+    if user_telegram_id not in settings.admin_ids:
+        # Verify chat room ownership (the user lookup is independent, so run both at once)
+        chat_room, db_user = await asyncio.gather(
+            get_chat_room_by_id(chat_room_id),
+            get_user_by_telegram_id(user_telegram_id),
+        )
+        if not chat_room:
+            raise HTTPException(status_code=404, detail="Chat room not found")
 
-    # Check ownership
-    # For private chats, telegram_chat_id equals user's telegram_id
-    # For groups, check if user is admin or has sent messages in this room
-    is_owner = False
-
-    if chat_room.type == "private":
-        # Private chat: telegram_chat_id should match user's telegram_id
-        is_owner = (chat_room.telegram_chat_id == user_telegram_id)
-    else:
-        # Group/Channel: check if user is admin or has participated
-        if user_telegram_id in settings.admin_ids:
-            is_owner = True
+        # For private chats, telegram_chat_id equals user's telegram_id
+        # For groups, check if user has sent messages in this room
+        if chat_room.type == "private":
+            is_owner = (chat_room.telegram_chat_id == user_telegram_id)
         else:
-            # Check if user has participated in this chat room
-            from repository.chat_room_repository import get_chat_room_participants
-            from repository.user_repository import get_user_by_telegram_id
-            db_user = await get_user_by_telegram_id(user_telegram_id)
-            if db_user:
-                participants = await get_chat_room_participants(chat_room_id)
-                if any(p.id == db_user.id for p in participants):
-                    is_owner = True
-
-    if not is_owner:
-        raise HTTPException(status_code=403, detail="You don't have permission to modify this chat room")
+            is_owner = bool(db_user) and await is_participant(chat_room_id, db_user.id)
+
+        if not is_owner:
+            raise HTTPException(status_code=403, detail="You don't have permission to modify this chat room")
 
     # Set persona
     chat_room = await set_chat_room_persona(
         chat_room_id=chat_room_id,
         persona_id=request.persona_id,
     )
+    if not chat_room:
+        raise HTTPException(status_code=404, detail="Chat room not found")
 
     return {
         "message": "Persona set successfully",
@@ -336,62 +362,38 @@ async def set_chat_room_persona_endpoint(
     }
 
 
-@router.post("/{persona_id}/evaluate", response_model=EvaluationResponse)
+@router.post("/{persona_id}/evaluate", response_model=None, responses={200: {"model": EvaluationResponse}})
 async def create_evaluation_endpoint(
-    persona_id: str,
+    persona_id: uuid.UUID,
     evaluation: EvaluationCreate = Body(...),
     current_user: Dict[str, Any] = Depends(get_current_user_required),
 ):
     """
     Persona 평가 생성
     """
-    from repository.user_repository import get_user_by_telegram_id
-    from repository.evaluation_repository import create_evaluation
-    import uuid
-
     db_user = await get_user_by_telegram_id(int(current_user["id"]))
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
         
     try:
         created = await create_evaluation(
-            persona_id=uuid.UUID(persona_id),
+            persona_id=persona_id,
             user_id=db_user.id,
             score=evaluation.score,
             comment=evaluation.comment
         )
-        return EvaluationResponse(
-            id=str(created.id),
-            persona_id=str(created.persona_id),
-            user_id=str(created.user_id),
-            score=created.score,
-            comment=created.comment,
-            created_at=created.created_at.isoformat()
-        )
+        return _model_response(EvaluationResponse.model_construct(**_evaluation_to_dict(created)))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/{persona_id}/evaluations", response_model=List[EvaluationResponse])
+@router.get("/{persona_id}/evaluations", response_model=None, responses={200: {"model": List[EvaluationResponse]}})
 async def get_evaluations_endpoint(
-    persona_id: str,
+    persona_id: uuid.UUID,
 ):
     """
     Persona 평가 목록 조회
     """
-    from repository.evaluation_repository import get_persona_evaluations
-    import uuid
-
-    evaluations = await get_persona_evaluations(uuid.UUID(persona_id))
-    return [
-        EvaluationResponse(
-            id=str(e.id),
-            persona_id=str(e.persona_id),
-            user_id=str(e.user_id),
-            score=e.score,
-            comment=e.comment,
-            created_at=e.created_at.isoformat()
-        )
-        for e in evaluations
-    ]
+    evaluations = await get_persona_evaluations(persona_id)
+    return ORJSONResponse([_evaluation_to_dict(e) for e in evaluations])
 
@@ -1,19 +1,28 @@
+from typing import Optional
 from fastapi import APIRouter
+from pydantic import BaseModel
 from services.conversation_service import ask_question
 
 
 router = APIRouter()
 
 
+class AskRequest(BaseModel):
+    # Missing fields keep the endpoint's {"error": ...} replies instead of a 422
+    question: str = ""
+    user_id: Optional[str] = None
+    chat_room_id: Optional[str] = None
+
+
 @router.post("/ask")
-async def ask(payload: dict):
+async def ask(payload: AskRequest):
     """Answers a question using the RAG-based assistant.
 
     This endpoint delegates the question to the conversational AI service, 
     which may use internal knowledge, web search, or memory to generate an answer.
 
     Args:
-        payload (dict):
+        payload (AskRequest):
             - question (str): The user's question. (Required)
             - user_id (str, optional): The user's ID.
             - chat_room_id (str): The chat room ID. (Required)
@@ -21,9 +30,9 @@ async def ask(payload: dict):
     Returns:
         dict: A dictionary containing the "answer" key with the generated response.
     """
-    question = payload.get("question", "").strip()
-    user_id = payload.get("user_id")
-    chat_room_id = payload.get("chat_room_id")
+    question = payload.question.strip()
+    user_id = payload.user_id
+    chat_room_id = payload.chat_room_id
     
     if not question:
         return {"error": "question is required"}
@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Request, BackgroundTasks
+from fastapi import APIRouter, Request, Response, UploadFile
 import asyncio
-from typing import Dict
+import base64
+import orjson
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Optional
 from telegram import Update, Bot
+from telegram.constants import ChatAction
+from telegram.error import RetryAfter
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
 from core.config import get_settings
 from agent.graph import graph
 from core.logger import get_logger
@@ -9,6 +21,10 @@ from langchain_core.messages import HumanMessage, AIMessage
 from repository.user_repository import upsert_user
 from repository.chat_room_repository import upsert_chat_room, set_chat_room_persona
 from repository.persona_repository import get_public_personas, get_persona_by_id, create_persona, get_user_personas
+from services.conversation_service import ask_question_stream, summarize_chat_room
+from services.knowledge_service import process_uploaded_file, get_chat_room_documents, delete_document
+from api.persona_router import PersonaCreate
+from pydantic import ValidationError
 
 logger = get_logger(__name__)
 
@@ -16,99 +32,247 @@ router = APIRouter()
 
 settings = get_settings()
 bot_token = settings.telegram.bot_token
-# Initialize Bot only if token is present to avoid errors during startup if not configured
-bot = Bot(token=bot_token) if bot_token else None
-
-@router.post("/webhook")
-async def webhook(request: Request, background_tasks: BackgroundTasks):
+# Initialize Bot only if token is present to avoid errors during startup if not configured.
+# PTB's default request pools a single connection; streaming edits for concurrent chats
+# need a real pool, opened in init_bot_identity() and closed in shutdown_bot().
+bot = Bot(
+    token=bot_token,
+    request=HTTPXRequest(
+        connection_pool_size=settings.telegram.connection_pool_size,
+        pool_timeout=5.0,
+        http_version=settings.telegram.http_version,
+    ),
+) if bot_token else None
+
+# Streaming settings, read once instead of per chunk in the edit loop
+MESSAGE_LIMIT = settings.telegram.message_limit
+UPDATE_INTERVAL = settings.telegram.update_interval
+UPDATE_MIN_CHARS = settings.telegram.update_min_chars
+UPDATE_MAX_INTERVAL = settings.telegram.update_max_interval
+UPDATE_BACKOFF = 1.5  # Interval multiplier per rate-limit hit (divided back out per successful edit)
+UPDATE_INTERVAL_CAP = 4.0
+
+# Webhook replies are constant, so they are serialized once
+_WEBHOOK_OK = orjson.dumps({"status": "ok"})
+_WEBHOOK_NO_BOT = orjson.dumps({"status": "error", "message": "Bot token not configured"})
+
+
+@router.post("/webhook", response_class=Response)
+async def webhook(request: Request):
     if not bot:
-        return {"status": "error", "message": "Bot token not configured"}
+        return Response(content=_WEBHOOK_NO_BOT, media_type="application/json")
         
-    data = await request.json()
     try:
+        data = orjson.loads(await request.body())
         update = Update.de_json(data, bot)
         if update.message and (update.message.text or update.message.document or update.message.photo):
-            background_tasks.add_task(process_update, update)
+            enqueue_update(update)
     except Exception as e:
-        print(f"Error parsing update: {e}")
+        logger.error(f"Error parsing update: {e}", exc_info=True)
         
-    return {"status": "ok"}
+    return Response(content=_WEBHOOK_OK, media_type="application/json")
 
 
-# Global cache for bot username
-BOT_USERNAME = None
+# Per-chat update queues: updates within a chat are handled in order by that chat's worker,
+# while different chats are processed concurrently (no cross-chat head-of-line blocking).
+CHAT_QUEUES: Dict[int, asyncio.Queue] = {}
+CHAT_WORKERS: Dict[int, asyncio.Task] = {}
+# Strong references to fire-and-forget tasks (the loop only keeps weak ones)
+_BACKGROUND_TASKS: set = set()
 
-# Global lock per user to prevent concurrent processing
-USER_LOCKS: Dict[int, asyncio.Lock] = {}
 
-def get_user_lock(user_id: int) -> asyncio.Lock:
-    if user_id not in USER_LOCKS:
-        USER_LOCKS[user_id] = asyncio.Lock()
-    return USER_LOCKS[user_id]
+def _spawn(coro) -> asyncio.Task:
+    """Starts a tracked background task, cancelled by stop_chat_workers on shutdown."""
+    task = asyncio.create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    return task
 
-async def _process_update_impl(update: Update):
-    global BOT_USERNAME
-    
+
+def enqueue_update(update: Update) -> None:
+    """Queues a message update on its chat's worker, starting the worker if needed."""
+    # The webhook only enqueues message updates, which always carry a chat
+    chat = update.effective_chat
+
+    queue = CHAT_QUEUES.get(chat.id)
+    if queue is None:
+        queue = CHAT_QUEUES[chat.id] = asyncio.Queue(maxsize=settings.telegram.chat_queue_max_size)
     try:
-        user = update.effective_user
-        chat = update.effective_chat
-        message = update.message
-        
-        # Handle edited messages or other updates that might not have a message
-        if not message:
-            logger.debug("Update has no message, skipping")
-            return
+        queue.put_nowait(update)
+    except asyncio.QueueFull:
+        # Reject instead of stacking up a backlog the user would wait minutes for
+        logger.warning(f"Chat queue full for chat_id={chat.id}, dropping update")
+        if update.message:
+            _spawn(_reply_queue_full(chat.id, update.message.message_id))
+        return
+    if chat.id not in CHAT_WORKERS:
+        CHAT_WORKERS[chat.id] = asyncio.create_task(_chat_worker(chat.id, queue))
 
-        if user.is_bot:
-            logger.debug(f"Ignoring message from bot user_id={user.id}")
-            return
 
-        text = message.text or message.caption
-        
-        if not text and not message.photo and not message.document:
-            logger.debug("Message has no text, photo, or document, skipping")
-            return
-        
-        logger.info(f"Processing message from chat_id={chat.id}, chat_type={chat.type}, user_id={user.id}, text_preview={text[:50] if text else 'photo/doc'}")
+async def _reply_queue_full(chat_id: int, message_id: int) -> None:
+    try:
+        await bot.send_message(
+            chat_id=chat_id,
+            text="You're sending messages too fast. Please wait for the current replies to finish.",
+            reply_to_message_id=message_id,
+        )
+    except Exception as e:
+        logger.debug(f"Failed to send queue-full notice: {e}")
+
 
-        # Lazy load bot username
-        if BOT_USERNAME is None:
-            if settings.telegram.bot_username:
-                 BOT_USERNAME = settings.telegram.bot_username
-            elif bot:
+async def _chat_worker(chat_id: int, queue: asyncio.Queue) -> None:
+    """Processes one chat's updates in order; exits after sitting idle."""
+    idle_timeout = settings.telegram.chat_worker_idle_timeout
+    try:
+        while True:
+            try:
+                update = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                # No await between the emptiness check and cleanup, so no update can slip in
+                if queue.empty():
+                    return
+                continue
+            try:
+                await process_update(update)
+            except Exception as e:
+                logger.error(f"Chat worker {chat_id} failed to process update: {e}", exc_info=True)
+    finally:
+        CHAT_WORKERS.pop(chat_id, None)
+        CHAT_QUEUES.pop(chat_id, None)
+
+
+async def stop_chat_workers() -> None:
+    """Cancels all per-chat workers and tracked background tasks (called on application shutdown)."""
+    workers = [*CHAT_WORKERS.values(), *_BACKGROUND_TASKS]
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+
+class TokenBucket:
+    """Token bucket limiter shared by all chats (refills `rate` tokens per second up to `capacity`)."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available, without waiting."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        """Waits until a token is available."""
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Telegram allows about 30 requests/s per bot; keep streaming edits below that across all chats
+EDIT_BUCKET = TokenBucket(rate=25, capacity=25)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """Flood-control wait requested by Telegram (int seconds or timedelta depending on PTB version)."""
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+
+async def _edit_text(chat_id: int, message_id: int, text: str) -> None:
+    """Edits a message once a rate-limit token is free, retrying once after a RetryAfter."""
+    await EDIT_BUCKET.acquire()
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+    except RetryAfter as e:
+        delay = _retry_after_seconds(e)
+        logger.warning(f"Rate limit hit during edit, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+
+
+# Bounds concurrent graph/LLM runs so a burst of chats queues here instead of
+# tripping provider rate limits (429 / ResourceExhausted)
+GRAPH_SEMAPHORE = asyncio.Semaphore(settings.telegram.max_concurrent_graph_runs)
+TYPING_INTERVAL = 5.0  # Telegram shows a chat action for ~5 seconds
+
+
+@asynccontextmanager
+async def _graph_slot(chat_id: int):
+    """Holds a GRAPH_SEMAPHORE slot, showing "typing..." in the chat while waiting for one."""
+    if GRAPH_SEMAPHORE.locked():
+        acquire = asyncio.ensure_future(GRAPH_SEMAPHORE.acquire())
+        try:
+            while not acquire.done():
                 try:
-                    me = await bot.get_me()
-                    BOT_USERNAME = me.username
+                    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
                 except Exception as e:
-                    print(f"Failed to fetch bot username: {e}")
+                    logger.debug(f"Failed to send typing action: {e}")
+                await asyncio.wait({acquire}, timeout=TYPING_INTERVAL)
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                GRAPH_SEMAPHORE.release()
+            else:
+                acquire.cancel()
+            raise
+    else:
+        await GRAPH_SEMAPHORE.acquire()
+    try:
+        yield
+    finally:
+        GRAPH_SEMAPHORE.release()
 
 
-        # 1. Ensure User exists
-        # Email is required, so generate one
-        logger.debug(f"Upserting user with telegram_id={user.id}")
-        email = f"telegram_{user.id}@telegram.placeholder"
-        db_user = await upsert_user(
-            email=email,
-            telegram_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
-        )
-        logger.debug(f"User upserted: db_user_id={db_user.id}")
-        
-        # 2. Ensure ChatRoom exists
-        logger.debug(f"Upserting chat room with telegram_chat_id={chat.id}")
-        db_chat_room = await upsert_chat_room(
-            telegram_chat_id=chat.id,
-            name=chat.title or user.first_name,
-            type=chat.type,
-            username=chat.username
-        )
-        logger.debug(f"Chat room upserted: db_chat_room_id={db_chat_room.id}")
-        
-        # 3. Handle Commands
-        if text and (text.startswith("/start") or text.startswith("/help")):
-            help_text = """
+@dataclass(frozen=True)
+class BotIdentity:
+    id: Optional[int]
+    username: Optional[str]
+    at_mention: Optional[str]  # "@username", lowercased for mention matching
+
+
+def _make_bot_identity(bot_id: Optional[int], username: Optional[str]) -> BotIdentity:
+    return BotIdentity(id=bot_id, username=username, at_mention=f"@{username}".lower() if username else None)
+
+
+# Resolved once at startup by init_bot_identity()
+BOT_IDENTITY = _make_bot_identity(None, settings.telegram.bot_username)
+
+
+async def init_bot_identity() -> None:
+    """Opens the bot's connection pool and fetches its id/username once (called from the application lifespan)."""
+    global BOT_IDENTITY
+    if not bot:
+        return
+    try:
+        # initialize() starts the HTTP client and calls getMe
+        await bot.initialize()
+        me = bot.bot
+        BOT_IDENTITY = _make_bot_identity(me.id, settings.telegram.bot_username or me.username)
+    except Exception as e:
+        logger.error(f"Failed to fetch bot identity: {e}")
+
+
+def _is_for_other_bot(suffix: str) -> bool:
+    """True for group commands like "/start@OtherBot" whose "@" suffix names a different bot."""
+    return bool(suffix) and BOT_IDENTITY.at_mention is not None and "@" + suffix.lower() != BOT_IDENTITY.at_mention
+
+
+async def shutdown_bot() -> None:
+    """Closes the bot's connection pool (called from the application lifespan)."""
+    if bot:
+        await bot.shutdown()
+
+# --- Command handlers: (chat, db_user, db_chat_room, args) where args is the text after the command ---
+
+HELP_TEXT = """
 Hello! I am your AI assistant. You can use the following commands:
 
 /help - Show this help message
@@ -118,194 +282,322 @@ Hello! I am your AI assistant. You can use the following commands:
 /select_persona <id> - Select a persona
 /create_persona <json> - Create a new persona (e.g. /create_persona {"name": "Name", "content": "Prompt"})
 """
-            await bot.send_message(chat_id=chat.id, text=help_text)
-            return
 
-        if text and text.startswith("/create_persona"):
-            # Expected format: /create_persona {"name": "...", "content": "..."}
-            try:
-                import json
-                # Extract JSON part
-                json_str = text.replace("/create_persona", "", 1).strip()
-                if not json_str:
-                    await bot.send_message(
-                        chat_id=chat.id, 
-                        text="Please provide persona data in JSON format.\nExample: /create_persona {\"name\": \"My Persona\", \"content\": \"You are a helpful assistant.\"}"
-                    )
-                    return
+CREATE_PERSONA_USAGE = (
+    "Please provide persona data in JSON format.\n"
+    'Example: /create_persona {"name": "My Persona", "content": "You are a helpful assistant."}'
+)
 
-                data = json.loads(json_str)
-                name = data.get("name")
-                content = data.get("content")
-                description = data.get("description")
-                is_public = data.get("is_public", False)
 
-                if not name or not content:
-                    await bot.send_message(chat_id=chat.id, text="Name and content are required.")
-                    return
+async def _cmd_help(chat, db_user, db_chat_room, args: str):
+    await bot.send_message(chat_id=chat.id, text=HELP_TEXT)
 
-                new_persona = await create_persona(
-                    user_id=db_user.id,
-                    name=name,
-                    content=content,
-                    description=description,
-                    is_public=is_public
-                )
-                await bot.send_message(chat_id=chat.id, text=f"Persona created: {new_persona.name} (ID: {new_persona.id})")
-            except json.JSONDecodeError:
-                await bot.send_message(chat_id=chat.id, text="Invalid JSON format.")
-            except Exception as e:
-                await bot.send_message(chat_id=chat.id, text=f"Error creating persona: {e}")
-            return
 
-        if text and text.startswith("/personas"):
-            # List user's personas + public personas
-            try:
-                user_personas = await get_user_personas(db_user.id, include_public=True)
-                if not user_personas:
-                    await bot.send_message(chat_id=chat.id, text="No personas found.")
-                else:
-                    msg = "Available Personas:\n\n"
-                    for p in user_personas:
-                        msg += f"- {p.name}\n  ID: `{p.id}`\n  {p.description or ''}\n\n"
-                    msg += "Use `/select_persona <id>` to set."
-                    await bot.send_message(chat_id=chat.id, text=msg, parse_mode="Markdown")
-            except Exception as e:
-                await bot.send_message(chat_id=chat.id, text=f"Error fetching personas: {e}")
+async def _cmd_create_persona(chat, db_user, db_chat_room, args: str):
+    # Expected format: /create_persona {"name": "...", "content": "..."}
+    try:
+        # Extract JSON part
+        json_str = args.strip()
+        if not json_str:
+            await bot.send_message(chat_id=chat.id, text=CREATE_PERSONA_USAGE)
             return
 
-        if text and text.startswith("/select_persona"):
-            parts = text.split()
-            if len(parts) < 2:
-                await bot.send_message(chat_id=chat.id, text="Usage: /select_persona <id>")
-                return
-                
-            persona_id = parts[1]
-            try:
-                # Verify persona exists
-                persona = await get_persona_by_id(persona_id)
-                if persona:
-                    await set_chat_room_persona(db_chat_room.id, persona.id)
-                    await bot.send_message(chat_id=chat.id, text=f"Persona set to: {persona.name}")
-                else:
-                    await bot.send_message(chat_id=chat.id, text="Persona not found.")
-            except Exception as e:
-                await bot.send_message(chat_id=chat.id, text=f"Error setting persona: {e}")
+        # Parse and validate in one pass; shares the size limits of the REST API
+        data = PersonaCreate.model_validate_json(json_str)
+
+        if not data.name or not data.content:
+            await bot.send_message(chat_id=chat.id, text="Name and content are required.")
             return
-            
-        if text and text.startswith("/persona"):
-            # Show current persona
-            if db_chat_room.persona_id:
-                persona = await get_persona_by_id(db_chat_room.persona_id)
-                if persona:
-                    await bot.send_message(chat_id=chat.id, text=f"Current Persona: {persona.name}\n{persona.description or ''}")
-                else:
-                    await bot.send_message(chat_id=chat.id, text="Current persona ID not found (maybe deleted).")
-            else:
-                await bot.send_message(chat_id=chat.id, text="No persona set. Using default.")
+
+        new_persona = await create_persona(user_id=db_user.id, **data.model_dump())
+        await bot.send_message(chat_id=chat.id, text=f"Persona created: {new_persona.name} (ID: {new_persona.id})")
+    except ValidationError as e:
+        errors = e.errors()
+        if any(err["type"] == "json_invalid" for err in errors):
+            await bot.send_message(chat_id=chat.id, text="Invalid JSON format.")
+        elif any(err["type"] == "missing" for err in errors):
+            await bot.send_message(chat_id=chat.id, text="Name and content are required.")
+        else:
+            err = errors[0]
+            field = ".".join(str(loc) for loc in err["loc"])
+            await bot.send_message(chat_id=chat.id, text=f"Invalid persona data ({field}): {err['msg']}")
+    except Exception as e:
+        await bot.send_message(chat_id=chat.id, text=f"Error creating persona: {e}")
+
+
+async def _cmd_list_personas(chat, db_user, db_chat_room, args: str):
+    # List user's personas + public personas
+    try:
+        user_personas = await get_user_personas(db_user.id, include_public=True)
+        if not user_personas:
+            await bot.send_message(chat_id=chat.id, text="No personas found.")
+        else:
+            body = "".join(
+                f"- {p.name}\n  ID: `{p.id}`\n  {p.description or ''}\n\n" for p in user_personas
+            )
+            msg = f"Available Personas:\n\n{body}Use `/select_persona <id>` to set."
+            await bot.send_message(chat_id=chat.id, text=msg, parse_mode="Markdown")
+    except Exception as e:
+        await bot.send_message(chat_id=chat.id, text=f"Error fetching personas: {e}")
+
+
+async def _cmd_select_persona(chat, db_user, db_chat_room, args: str):
+    parts = args.split()
+    if not parts:
+        await bot.send_message(chat_id=chat.id, text="Usage: /select_persona <id>")
+        return
+        
+    persona_id = parts[0]
+    try:
+        # Verify persona exists
+        persona = await get_persona_by_id(persona_id)
+        if persona:
+            await set_chat_room_persona(db_chat_room.id, persona.id)
+            await bot.send_message(chat_id=chat.id, text=f"Persona set to: {persona.name}")
+        else:
+            await bot.send_message(chat_id=chat.id, text="Persona not found.")
+    except Exception as e:
+        await bot.send_message(chat_id=chat.id, text=f"Error setting persona: {e}")
+
+
+async def _cmd_show_persona(chat, db_user, db_chat_room, args: str):
+    # Show current persona
+    if db_chat_room.persona_id:
+        persona = await get_persona_by_id(db_chat_room.persona_id)
+        if persona:
+            await bot.send_message(chat_id=chat.id, text=f"Current Persona: {persona.name}\n{persona.description or ''}")
+        else:
+            await bot.send_message(chat_id=chat.id, text="Current persona ID not found (maybe deleted).")
+    else:
+        await bot.send_message(chat_id=chat.id, text="No persona set. Using default.")
+
+
+async def _cmd_summary(chat, db_user, db_chat_room, args: str):
+    await bot.send_message(chat_id=chat.id, text="대화 내용을 요약하고 있습니다. 잠시만 기다려주세요...")
+    try:
+        summary = await summarize_chat_room(chat_room_id=db_chat_room.id, user_id=db_user.id)
+        # Use MarkdownV2 for better stability, escape the LLM output
+        safe_summary = escape_markdown(summary, version=2)
+        # Header "📋 대화 요약" in bold. Note: emojis don't strictly need escaping but good practice to be safe or just string format
+        header = escape_markdown("📋 대화 요약", version=2)
+
+        await bot.send_message(
+            chat_id=chat.id, 
+            text=f"*{header}*\n\n{safe_summary}", 
+            parse_mode="MarkdownV2"
+        )
+    except Exception as e:
+        logger.error(f"Error executing summary command: {e}")
+        await bot.send_message(chat_id=chat.id, text="대화 요약 중 오류가 발생했습니다.")
+
+
+async def _cmd_files(chat, db_user, db_chat_room, args: str):
+    # List known documents
+    try:
+        logger.info(f"Listing files for chat_room_id={db_chat_room.id}")
+        docs = await get_chat_room_documents(str(db_chat_room.id))
+
+        if not docs:
+            logger.info("No docs returned from service.")
+            await bot.send_message(chat_id=chat.id, text="No uploaded documents found in this room.")
+        else:
+            entries = []
+            for doc in docs:
+                # Escape filename for Markdown (v1 legacy used here since parse_mode="Markdown")
+                # Version 1 escapes are minimal but we need to be careful.
+                # Actually let's just use explicit replacements or safe text.
+                # Using MarkdownV2 is better but requires escaping everything.
+                # Let's stick to v1 but escape common chars.
+                safe_filename = doc.filename.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`").replace("[", "\\[")
+
+                sub_text = f"Method: {doc.processing_method}, Size: {doc.size or 0} bytes"
+                # Escape sub_text chars too just in case
+                sub_text = sub_text.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`")
+
+                entries.append(f"📄 *{safe_filename}*\n   ID: `{doc.id}`\n   {sub_text}\n\n")
+
+            msg = f"📚 *Uploaded Documents*:\n\n{''.join(entries)}Use `/delete_file <id>` to remove."
+            await bot.send_message(chat_id=chat.id, text=msg, parse_mode="Markdown")
+    except Exception as e:
+        logger.error(f"Error fetching files: {e}")
+        await bot.send_message(chat_id=chat.id, text="Failed to retrieve file list.")
+
+
+async def _cmd_delete_file(chat, db_user, db_chat_room, args: str):
+    # Delete a document
+    parts = args.split()
+    if not parts:
+        await bot.send_message(chat_id=chat.id, text="Usage: /delete_file <id>")
+        return
+
+    doc_id = parts[0]
+    try:
+        success = await delete_document(doc_id, str(db_chat_room.id))
+
+        if success:
+            await bot.send_message(chat_id=chat.id, text=f"✅ Document `{doc_id}` deleted successfully.", parse_mode="Markdown")
+        else:
+            await bot.send_message(chat_id=chat.id, text=f"❌ Failed to delete document. Check ID and Permissions.")
+    except Exception as e:
+        logger.error(f"Error deleting file: {e}")
+        await bot.send_message(chat_id=chat.id, text=f"Error deleting file: {e}")
+
+
+# Exact command -> handler (one dict lookup instead of a chain of startswith checks)
+COMMANDS = {
+    "/start": _cmd_help,
+    "/help": _cmd_help,
+    "/create_persona": _cmd_create_persona,
+    "/personas": _cmd_list_personas,
+    "/select_persona": _cmd_select_persona,
+    "/persona": _cmd_show_persona,
+    "/summary": _cmd_summary,
+    "/files": _cmd_files,
+    "/delete_file": _cmd_delete_file,
+}
+
+
+class KeyedLockPool:
+    """Per-key asyncio locks that only exist while a coroutine holds or waits on them.
+
+    Entries are reference-counted and dropped when the last user leaves, so memory
+    tracks currently active keys instead of every key ever seen.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, list] = {}  # key -> [lock, refcount]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def acquire(self, key: int):
+        # No await between lookup and insert, so this is atomic on the event loop
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+# Per-user lock serializing user/chat room upserts across chats
+USER_LOCKS = KeyedLockPool()
+
+_MIME_PREFIX = "data:image/jpeg;base64,"
+
+
+def _encode_image(image_bytes: bytes | bytearray) -> str:
+    """Encode a photo as a data URL; run via asyncio.to_thread so large images don't stall the loop."""
+    return _MIME_PREFIX + base64.b64encode(image_bytes).decode("ascii")
+
+
+async def _download_photo(photo) -> Optional[str]:
+    """Downloads a photo as a data URL; failures are logged and returned as None."""
+    try:
+        file_obj = await bot.get_file(photo.file_id)
+        image_bytes = await file_obj.download_as_bytearray()
+        return await asyncio.to_thread(_encode_image, image_bytes)
+    except Exception as e:
+        logger.error(f"Error processing photo: {e}")
+        return None
+
+
+async def process_update(update: Update):
+    """Handles one update; callers (the per-chat workers) guarantee in-order processing per chat."""
+    try:
+        user = update.effective_user
+        chat = update.effective_chat
+        message = update.message
+        
+        # Handle edited messages or other updates that might not have a message
+        if not message:
+            logger.debug("Update has no message, skipping")
             return
 
-        if text and text.startswith("/summary"):
-            await bot.send_message(chat_id=chat.id, text="대화 내용을 요약하고 있습니다. 잠시만 기다려주세요...")
-            try:
-                from services.conversation_service import summarize_chat_room
-                from telegram.helpers import escape_markdown
-                
-                summary = await summarize_chat_room(chat_room_id=db_chat_room.id, user_id=db_user.id)
-                # Use MarkdownV2 for better stability, escape the LLM output
-                safe_summary = escape_markdown(summary, version=2)
-                # Header "📋 대화 요약" in bold. Note: emojis don't strictly need escaping but good practice to be safe or just string format
-                header = escape_markdown("📋 대화 요약", version=2)
-                
-                await bot.send_message(
-                    chat_id=chat.id, 
-                    text=f"*{header}*\n\n{safe_summary}", 
-                    parse_mode="MarkdownV2"
-                )
-            except Exception as e:
-                logger.error(f"Error executing summary command: {e}")
-                await bot.send_message(chat_id=chat.id, text="대화 요약 중 오류가 발생했습니다.")
+        if user.is_bot:
+            logger.debug(f"Ignoring message from bot user_id={user.id}")
             return
 
-        if text and text.startswith("/files"):
-            # List known documents
-            try:
-                from services.knowledge_service import get_chat_room_documents
-                from telegram.helpers import escape_markdown
-                
-                logger.info(f"Listing files for chat_room_id={db_chat_room.id}")
-                docs = await get_chat_room_documents(str(db_chat_room.id))
-                
-                if not docs:
-                    logger.info("No docs returned from service.")
-                    await bot.send_message(chat_id=chat.id, text="No uploaded documents found in this room.")
-                else:
-                    msg = "📚 *Uploaded Documents*:\n\n"
-                    for doc in docs:
-                        # Escape filename for Markdown (v1 legacy used here since parse_mode="Markdown")
-                        # Version 1 escapes are minimal but we need to be careful.
-                        # Actually let's just use explicit replacements or safe text.
-                        # Using MarkdownV2 is better but requires escaping everything.
-                        # Let's stick to v1 but escape common chars.
-                        safe_filename = doc.filename.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`").replace("[", "\\[")
-                        
-                        sub_text = f"Method: {doc.processing_method}, Size: {doc.size or 0} bytes"
-                        # Escape sub_text chars too just in case
-                        sub_text = sub_text.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`")
-                        
-                        msg += f"📄 *{safe_filename}*\n   ID: `{doc.id}`\n   {sub_text}\n\n"
-                    
-                    msg += "Use `/delete_file <id>` to remove."
-                    await bot.send_message(chat_id=chat.id, text=msg, parse_mode="Markdown")
-            except Exception as e:
-                logger.error(f"Error fetching files: {e}")
-                await bot.send_message(chat_id=chat.id, text="Failed to retrieve file list.")
+        text = message.text or message.caption
+        
+        if not text and not message.photo and not message.document:
+            logger.debug("Message has no text, photo, or document, skipping")
             return
 
-        if text and text.startswith("/delete_file"):
-            # Delete a document
-            parts = text.split()
-            if len(parts) < 2:
-                await bot.send_message(chat_id=chat.id, text="Usage: /delete_file <id>")
+        # Resolve the command up front so command messages skip the photo download
+        handler = None
+        command_args = ""
+        if text and text.startswith("/"):
+            parts = text.split(maxsplit=1)
+            # "/help@MyBot" in groups addresses the same command
+            command, _, suffix = parts[0].partition("@")
+            if _is_for_other_bot(suffix):
+                logger.debug(f"Ignoring command addressed to another bot in chat_id={chat.id}")
                 return
-            
-            doc_id = parts[1]
-            try:
-                from services.knowledge_service import delete_document
-                success = await delete_document(doc_id, str(db_chat_room.id))
-                
-                if success:
-                    await bot.send_message(chat_id=chat.id, text=f"✅ Document `{doc_id}` deleted successfully.", parse_mode="Markdown")
-                else:
-                    await bot.send_message(chat_id=chat.id, text=f"❌ Failed to delete document. Check ID and Permissions.")
-            except Exception as e:
-                logger.error(f"Error deleting file: {e}")
-                await bot.send_message(chat_id=chat.id, text=f"Error deleting file: {e}")
+            handler = COMMANDS.get(command)
+            command_args = parts[1] if len(parts) > 1 else ""
+
+        logger.info(f"Processing message from chat_id={chat.id}, chat_type={chat.type}, user_id={user.id}, text_preview={text[:50] if text else 'photo/doc'}")
+
+        # Fetch the largest photo size while the upserts run, outside the user lock
+        photo_task = None
+        if message.photo and handler is None:
+            photo_task = asyncio.create_task(_download_photo(message.photo[-1]))
+
+        # 1-2. Ensure User and ChatRoom exist; the two upserts are independent,
+        # so they share one round-trip window instead of running back to back.
+        # Email is required, so generate one
+        logger.debug(f"Upserting user telegram_id={user.id} and chat room telegram_chat_id={chat.id}")
+        email = f"telegram_{user.id}@telegram.placeholder"
+        try:
+            # Only the upserts are serialized per user (a user writing in several chats at
+            # once would otherwise race on creating the same row); the rest runs lock-free
+            async with USER_LOCKS.acquire(user.id):
+                db_user, db_chat_room = await asyncio.gather(
+                    upsert_user(
+                        email=email,
+                        telegram_id=user.id,
+                        username=user.username,
+                        first_name=user.first_name,
+                        last_name=user.last_name
+                    ),
+                    upsert_chat_room(
+                        telegram_chat_id=chat.id,
+                        name=chat.title or user.first_name,
+                        type=chat.type,
+                        username=chat.username
+                    ),
+                )
+        except BaseException:
+            if photo_task:
+                photo_task.cancel()
+            raise
+        logger.debug(f"Upserted db_user_id={db_user.id}, db_chat_room_id={db_chat_room.id}")
+        
+        # 3. Handle Commands
+        if handler:
+            await handler(chat, db_user, db_chat_room, command_args)
             return
 
         # 4. Invoke Graph with Streaming
-        import base64
-        from services.conversation_service import ask_question_stream
-        
         # Check for photo
         image_data = None
-        if message.photo:
-            try:
-                # Get largest photo
-                photo = message.photo[-1]
-                file_obj = await bot.get_file(photo.file_id)
-                image_bytes = await file_obj.download_as_bytearray()
-                b64_str = base64.b64encode(image_bytes).decode('utf-8')
-                image_data = f"data:image/jpeg;base64,{b64_str}"
-                
-                # If no text caption, use default text
-                if not text:
-                    text = "Describe this image."
-            except Exception as e:
-                logger.error(f"Error processing photo: {e}")
+        if photo_task:
+            image_data = await photo_task
+            if image_data is None:
                 await bot.send_message(chat_id=chat.id, text="Failed to process image.")
                 return
 
+            # If no text caption, use default text
+            if not text:
+                text = "Describe this image."
+
         # Check for Document (PDF/TXT)
         if message.document:
             try:
@@ -328,20 +620,13 @@ Hello! I am your AI assistant. You can use the following commands:
                     
                     file_obj = await bot.get_file(doc.file_id)
                     
-                    # Convert Telegram file to UploadFile-like object or byte stream
-                    # knowledge_service expects UploadFile but we can adapt it or change service to accept bytes.
-                    # Adapting here:
-                    from io import BytesIO
-                    from fastapi import UploadFile
-                    
-                    file_bytes = await file_obj.download_as_bytearray()
-                    byte_stream = BytesIO(file_bytes)
-                    
-                    # Mock UploadFile
-                    upload_file = UploadFile(file=byte_stream, filename=file_name)
-                    
-                    from services.knowledge_service import process_uploaded_file
-                    success, msg = await process_uploaded_file(str(db_chat_room.id), str(db_user.id), upload_file)
+                    # knowledge_service expects an UploadFile; spool the download to a temp file
+                    # so the document isn't held in memory while it is copied and ingested
+                    with tempfile.TemporaryDirectory() as tmp_dir:
+                        tmp_path = await file_obj.download_to_drive(os.path.join(tmp_dir, "upload"))
+                        with open(tmp_path, "rb") as fh:
+                            upload_file = UploadFile(file=fh, filename=file_name)
+                            success, msg = await process_uploaded_file(str(db_chat_room.id), str(db_user.id), upload_file)
                     
                     if success:
                          await bot.send_message(chat_id=chat.id, text=f"✅ {msg}")
@@ -379,7 +664,8 @@ Hello! I am your AI assistant. You can use the following commands:
             }
             
             try:
-                result = await graph.ainvoke(inputs)
+                async with _graph_slot(chat.id):
+                    result = await graph.ainvoke(inputs)
                 response_messages = result["messages"]
                 ai_response = response_messages[-1]
                 
@@ -389,7 +675,7 @@ Hello! I am your AI assistant. You can use the following commands:
                      await bot.send_message(chat_id=chat.id, text="I didn't get a response.")
                 
             except Exception as e:
-                print(f"Error processing message: {e}")
+                logger.error(f"Error processing image message for chat_id={chat.id}: {e}", exc_info=True)
                 if "429" in str(e) or "ResourceExhausted" in str(e):
                      await bot.send_message(chat_id=chat.id, text="죄송합니다. API 사용량을 초과했습니다. 나중에 다시 시도해 주세요.")
                 else:
@@ -403,89 +689,111 @@ Hello! I am your AI assistant. You can use the following commands:
             sent_msg = await bot.send_message(chat_id=chat.id, text="...")
             logger.debug(f"Sent initial message: message_id={sent_msg.message_id}")
             
-            full_response = ""
+            # Streamed deltas; joined only when an edit (or the final flush) needs the text
+            parts: list[str] = []
+            total_len = 0
             last_update_time = 0
+            last_sent_len = 0
+            # Edit interval widens after a 429 and decays back as edits succeed
+            update_interval = UPDATE_INTERVAL
+            loop = asyncio.get_running_loop()
             chunk_count = 0
 
             # List of sent messages to handle pagination
             sent_messages = [sent_msg]
-            sent_texts = {sent_msg.message_id: "..."}
-            MESSAGE_LIMIT = settings.telegram.message_limit
+            sent_texts = ["..."]  # Last text written to each page, aligned with sent_messages
+            # Pages whose final text has been written; never edited again
+            frozen: set[int] = set()
             
             # Determine user name for context
             user_name = db_user.first_name or db_user.username or "Unknown"
 
-            async for chunk in ask_question_stream(
-                user_id=str(db_user.id),
-                chat_room_id=str(db_chat_room.id),
-                question=text,
-                user_name=user_name
-            ):
-                # Smart update logic to handle both deltas and snapshots
-                if chunk.startswith(full_response) and len(chunk) >= len(full_response):
-                    # It's a snapshot (extended version of previous)
-                    full_response = chunk
-                else:
-                    # It's a delta (or a new independent chunk)
-                    full_response += chunk
-                chunk_count += 1
+            async with _graph_slot(chat.id):
+                async for chunk in ask_question_stream(
+                    user_id=str(db_user.id),
+                    chat_room_id=str(db_chat_room.id),
+                    question=text,
+                    user_name=user_name
+                ):
+                    # ask_question_stream yields deltas only
+                    parts.append(chunk)
+                    total_len += len(chunk)
+                    chunk_count += 1
                 
-                # Rate limit message updates
-                import time
-                current_time = time.time()
-                if current_time - last_update_time >= settings.telegram.update_interval:
-                    try:
-                        # Calculate how many messages we need
-                        num_needed = (len(full_response) // MESSAGE_LIMIT) + 1
+                    # Rate limit message updates: skipped ticks are coalesced into the next edit,
+                    # which always carries the full accumulated text. Small growth waits for
+                    # update_max_interval so each edit carries a meaningful amount of new text.
+                    current_time = loop.time()
+                    elapsed = current_time - last_update_time
+                    if (
+                        elapsed >= update_interval
+                        and (
+                            total_len - last_sent_len >= UPDATE_MIN_CHARS
+                            or elapsed >= UPDATE_MAX_INTERVAL
+                        )
+                        and EDIT_BUCKET.try_acquire()
+                    ):
+                        try:
+                            # Collapse the buffer so the next join only copies new deltas once
+                            full_response = "".join(parts)
+                            parts = [full_response]
+
+                            # Calculate how many messages we need
+                            num_needed = (total_len // MESSAGE_LIMIT) + 1
                         
-                        # If we need more messages than we have
-                        if num_needed > len(sent_messages):
-                            # First, finalize the current last message (fill it up and remove "...")
-                            prev_last_msg = sent_messages[-1]
-                            prev_last_idx = len(sent_messages) - 1
-                            prev_text = full_response[prev_last_idx * MESSAGE_LIMIT : (prev_last_idx + 1) * MESSAGE_LIMIT]
+                            # If we need more messages than we have
+                            if num_needed > len(sent_messages):
+                                # First, finalize the current last message (fill it up and remove "...")
+                                prev_last_msg = sent_messages[-1]
+                                prev_last_idx = len(sent_messages) - 1
+                                prev_text = full_response[prev_last_idx * MESSAGE_LIMIT : (prev_last_idx + 1) * MESSAGE_LIMIT]
                             
-                            if sent_texts.get(prev_last_msg.message_id) != prev_text:
-                                try:
-                                    await bot.edit_message_text(
-                                        chat_id=chat.id,
-                                        message_id=prev_last_msg.message_id,
-                                        text=prev_text
-                                    )
-                                    sent_texts[prev_last_msg.message_id] = prev_text
-                                except Exception as e:
-                                    logger.debug(f"Error finalizing previous message: {e}")
+                                if sent_texts[prev_last_idx] != prev_text:
+                                    try:
+                                        await bot.edit_message_text(
+                                            chat_id=chat.id,
+                                            message_id=prev_last_msg.message_id,
+                                            text=prev_text
+                                        )
+                                        sent_texts[prev_last_idx] = prev_text
+                                        frozen.add(prev_last_idx)
+                                    except Exception as e:
+                                        logger.debug(f"Error finalizing previous message: {e}")
                             
-                            # Add new messages
-                            while len(sent_messages) < num_needed:
-                                new_msg = await bot.send_message(chat_id=chat.id, text="...")
-                                sent_messages.append(new_msg)
-                                sent_texts[new_msg.message_id] = "..."
+                                # Add new messages
+                                while len(sent_messages) < num_needed:
+                                    new_msg = await bot.send_message(chat_id=chat.id, text="...")
+                                    sent_messages.append(new_msg)
+                                    sent_texts.append("...")
                         
-                        # Now update the (possibly new) last message
-                        last_msg_index = len(sent_messages) - 1
-                        start_idx = last_msg_index * MESSAGE_LIMIT
-                        current_chunk_text = full_response[start_idx:]
-                        new_text = current_chunk_text + "..."
+                            # Now update the (possibly new) last message
+                            last_msg_index = len(sent_messages) - 1
+                            start_idx = last_msg_index * MESSAGE_LIMIT
+                            current_chunk_text = full_response[start_idx:]
+                            new_text = current_chunk_text + "..."
                         
-                        if sent_texts.get(sent_messages[-1].message_id) != new_text:
-                            await bot.edit_message_text(
-                                chat_id=chat.id,
-                                message_id=sent_messages[-1].message_id,
-                                text=new_text
-                            )
-                            sent_texts[sent_messages[-1].message_id] = new_text
-                        last_update_time = current_time
-                    except Exception as e:
-                        # Ignore edit errors (message might be the same, or rate limited)
-                        if "429" in str(e) or "Too Many Requests" in str(e):
-                             logger.warning(f"Rate limit hit during edit: {e}")
-                             # Backoff slightly
-                             await asyncio.sleep(2)
-                        else:
-                             logger.debug(f"Edit message error: {e}")
+                            if sent_texts[-1] != new_text:
+                                await bot.edit_message_text(
+                                    chat_id=chat.id,
+                                    message_id=sent_messages[-1].message_id,
+                                    text=new_text
+                                )
+                                sent_texts[-1] = new_text
+                            last_update_time = current_time
+                            last_sent_len = total_len
+                            update_interval = max(UPDATE_INTERVAL, update_interval / UPDATE_BACKOFF)
+                        except RetryAfter as e:
+                            # Back off exactly as long as Telegram asks, then edit less often
+                            delay = _retry_after_seconds(e)
+                            update_interval = min(update_interval * UPDATE_BACKOFF, UPDATE_INTERVAL_CAP)
+                            logger.warning(f"Rate limit hit during edit, backing off {delay}s (interval now {update_interval:.2f}s)")
+                            await asyncio.sleep(delay)
+                        except Exception as e:
+                            # Ignore other edit errors (e.g. message is not modified)
+                            logger.debug(f"Edit message error: {e}")
             
-            logger.info(f"Streaming complete: received {chunk_count} chunks, total length={len(full_response)}")
+            full_response = "".join(parts)
+            logger.info(f"Streaming complete: received {chunk_count} chunks, total length={total_len}")
             
             # Safety check: If response is too huge, truncate or warn
             if len(sent_messages) > 20:
@@ -500,29 +808,29 @@ Hello! I am your AI assistant. You can use the following commands:
                 while len(sent_messages) < num_needed:
                     new_msg = await bot.send_message(chat_id=chat.id, text="...")
                     sent_messages.append(new_msg)
-                    sent_texts[new_msg.message_id] = "..."
+                    sent_texts.append("...")
                 
-                # Update all messages to ensure they are clean (no "...")
+                # Clean up every page not yet frozen (normally just the tail's "...").
+                # Pages are independent, so their edits go out concurrently; EDIT_BUCKET
+                # inside _edit_text keeps the burst within Telegram's limits.
+                edits = []
                 for i, msg in enumerate(sent_messages):
+                    if i in frozen:
+                        continue
                     start_idx = i * MESSAGE_LIMIT
                     end_idx = (i + 1) * MESSAGE_LIMIT
-                    text_chunk = full_response[start_idx:end_idx]
-                    
-                    # Only update if it's the last one OR if we want to remove "..." from previous ones
-                    # To be safe and clean, update all.
-                    
-                    final_text = text_chunk
+                    final_text = full_response[start_idx:end_idx]
                     if i == len(sent_messages) - 1 and not final_text:
                          final_text = "I didn't get a response."
 
-                    if sent_texts.get(msg.message_id) != final_text:
-                        await bot.edit_message_text(
-                            chat_id=chat.id,
-                            message_id=msg.message_id,
-                            text=final_text
-                        )
-                        sent_texts[msg.message_id] = final_text
-                logger.debug(f"Final message edit successful")
+                    if sent_texts[i] != final_text:
+                        edits.append(_edit_text(chat.id, msg.message_id, final_text))
+                        sent_texts[i] = final_text
+                results = await asyncio.gather(*edits, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Final edit failed: {result}")
+                logger.debug(f"Final message edits done: {len(edits)} sent")
             except Exception as e:
                 logger.error(f"Final edit error: {e}")
             
@@ -536,19 +844,3 @@ Hello! I am your AI assistant. You can use the following commands:
             await bot.send_message(chat_id=chat.id, text="Sorry, I encountered an error processing your message.")
         except Exception as send_error:
             logger.error(f"Failed to send error message to user: {send_error}")
-
-
-async def process_update(update: Update):
-    """
-    Wrapper around _process_update_impl to enforce sequential processing per user.
-    """
-    user = update.effective_user
-    if not user:
-        await _process_update_impl(update)
-        return
-
-    lock = get_user_lock(user.id)
-    async with lock:
-        await _process_update_impl(update)
-
-
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request, Depends, HTTPException, status, Form, Up
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from core.config import get_settings
+from core.logger import get_logger
 from core.security import get_current_user
 from repository.chat_room_repository import get_chat_room_by_telegram_id, get_chat_room_participants
 from repository.user_repository import get_user_by_telegram_id
@@ -11,6 +12,8 @@ from sqlalchemy import select
 from models.chat_room_model import ChatRoom
 import uuid
 
+logger = get_logger(__name__)
+
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 settings = get_settings()
@@ -102,9 +105,9 @@ async def upload_rag_file(
         success, message = await process_uploaded_file(chat_room_id, str(db_user.id), file)
         if not success:
             # Handle error (maybe add flash message support later)
-            print(f"Upload failed: {message}")
+            logger.warning(f"Upload failed for chat_room_id={chat_room_id}: {message}")
     except Exception as e:
-        print(f"Upload error: {e}")
+        logger.error(f"Upload error for chat_room_id={chat_room_id}: {e}", exc_info=True)
         
     return RedirectResponse(url=f"/rag/{chat_room_id}", status_code=302)
 
@@ -7,7 +7,7 @@ from repository.chat_room_repository import get_chat_room_by_telegram_id
 from repository.conversation_repository import get_history
 from repository.persona_repository import get_user_personas, get_persona_by_id
 from repository.user_repository import get_user_by_telegram_id
-from core.database import get_async_session
+from core.database import get_async_session, get_pool_status
 from repository.stats_repository import get_system_stats
 from core.logger import get_logger
 
@@ -317,6 +317,16 @@ async def admin_dashboard(request: Request):
     return templates.TemplateResponse(request, "admin_dashboard.html", get_template_context(request, user_data, {"stats": stats}))
 
 
+@router.get("/admin/pool")
+async def admin_pool_status(request: Request):
+    """DB 커넥션 풀 사용 현황 (관리자 전용)"""
+    user_data = get_current_user(request)
+    if not user_data or int(user_data["id"]) not in settings.admin_ids:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return get_pool_status()
+
+
 @router.get("/personas/{persona_id}", response_class=HTMLResponse)
 async def view_persona(request: Request, persona_id: str):
     user_data = get_current_user(request)
@@ -0,0 +1,26 @@
+import hashlib
+import json
+from typing import Any
+
+from cachetools import TTLCache
+
+# Exact-match cache for idempotent LLM calls (same model, system prompt and messages).
+# Everything runs on the event loop thread and get/set never await, so no lock is needed.
+llm_response_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+
+# Conversation summaries keyed by (previous summary, text to summarize); retries reuse the result.
+summary_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Builds a stable SHA-256 key from JSON-serializable parts.
+
+    Args:
+        *parts: Values identifying the cached call (model name, prompt, messages, ...)
+
+    Returns:
+        Hex digest usable as a cache key
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
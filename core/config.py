@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import List, Optional
+from typing import FrozenSet, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -11,6 +11,8 @@ class DatabaseSettings(BaseSettings):
     user: str = "postgres"
     password: str = "postgres"
     name: str = "chatbot_db"
+    pool_size: int = 10  # Persistent connections kept in the pool
+    max_overflow: int = 20  # Extra connections allowed under burst load
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -28,7 +30,14 @@ class TelegramSettings(BaseSettings):
     # Message handling settings
     message_limit: int = 4000  # Telegram message character limit
     update_interval: float = 0.5  # Seconds between message updates
+    update_min_chars: int = 200  # New characters required before a streaming edit
+    update_max_interval: float = 2.0  # Seconds after which an edit is sent regardless of growth
     max_file_size: int = 10 * 1024 * 1024  # Maximum file upload size (10MB)
+    chat_worker_idle_timeout: float = 300.0  # Seconds an idle per-chat worker waits before exiting
+    chat_queue_max_size: int = 10  # Pending updates per chat before new ones are rejected
+    connection_pool_size: int = 64  # Concurrent HTTP connections to the Bot API
+    max_concurrent_graph_runs: int = 16  # Concurrent agent/LLM runs across all chats
+    http_version: str = "1.1"  # "2" multiplexes edits over one connection (requires python-telegram-bot[http2])
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -61,6 +70,10 @@ class NotionSettings(BaseSettings):
 
 class AgentSettings(BaseSettings):
     recursion_limit: int = 20  # Maximum recursion depth for LangGraph
+    router_fast_path: bool = True  # Route greetings and obvious keyword requests without the LLM
+    router_batching: bool = False  # Coalesce concurrent cloud routing calls into one LLM request
+    router_batch_window: float = 0.02  # Seconds to wait for more routing requests before dispatching
+    router_max_batch: int = 8  # Maximum routing requests per batched LLM call
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -73,7 +86,10 @@ class LocalLLMSettings(BaseSettings):
     enabled: bool = False  # Enable local LLM router
     base_url: str = "http://172.16.1.101:11434"  # Ollama base URL
     model: str = "llama-3.1-8b"  # Local model name
+    router_model: Optional[str] = None  # Smaller model dedicated to routing decisions (defaults to `model`)
     timeout: float = 10.0  # Timeout in seconds
+    hedge_delay: float = 0.5  # Start the cloud router if local has not answered within this many seconds
+    circuit_breaker_reset: float = 60.0  # Skip the local router for this many seconds after it fails
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -84,7 +100,7 @@ class LocalLLMSettings(BaseSettings):
 
 class Settings(BaseSettings):
     log_level: str = "INFO"
-    admin_ids: List[int] = []
+    admin_ids: FrozenSet[int] = frozenset()  # Parsed from a JSON list; a set for O(1) membership checks
     tavily_api_key: Optional[str] = None
     secret_key: str = "change-me-to-a-secure-random-string"  # Mandatory SECRET_KEY
 
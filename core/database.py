@@ -46,15 +46,31 @@ def get_engine():
     global _engine
     if _engine is None:
         database_url = get_database_url()
+        db = get_settings().database
         _engine = create_async_engine(
             database_url,
             echo=False,
+            pool_size=db.pool_size,
+            max_overflow=db.max_overflow,
             pool_pre_ping=True,
             pool_recycle=300,
         )
     return _engine
 
 
+def get_pool_status() -> dict:
+    """커넥션 풀 사용 현황 반환 (엔진이 아직 없으면 빈 dict)"""
+    if _engine is None:
+        return {}
+    pool = _engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
+
 def get_async_session_maker():
     """AsyncSessionMaker 반환 (싱글톤)"""
     global _async_session_maker
@@ -1,12 +1,15 @@
-from typing import Optional
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from core.config import get_settings
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
+@lru_cache(maxsize=8)
 def get_llm(model_name: Optional[str] = None):
+    # Cached per model_name: chat model clients are stateless between calls,
+    # so nodes can share one instance instead of rebuilding it every turn.
     settings = get_settings()
     
     # Check if we should use Local LLM (e.g. Exo, Ollama)
@@ -23,6 +26,9 @@ def get_llm(model_name: Optional[str] = None):
             api_key = settings.local_llm_api_key
             
             logger.info(f"Initializing Local LLM (Exo/OpenAI) with model: {local_model} at {base_url}")
+            # Only needed for the local (OpenAI-compatible) backend, so import lazily
+            from langchain_openai import ChatOpenAI
+
             return ChatOpenAI(
                 base_url=base_url,
                 api_key=api_key,
@@ -46,6 +52,28 @@ def get_llm(model_name: Optional[str] = None):
     )
 
 
+class TokenUsage(NamedTuple):
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read: int = 0  # Input tokens served from the provider's prompt cache
+    cache_creation: int = 0  # Input tokens written to the provider's prompt cache
+
+
+def extract_usage(response) -> TokenUsage:
+    """
+    Extracts token usage (including prompt-cache counters) from an LLM response.
+    Responses without usage metadata yield all zeros.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return TokenUsage(
+        usage.get("input_tokens", 0),
+        usage.get("output_tokens", 0),
+        details.get("cache_read", 0),
+        details.get("cache_creation", 0),
+    )
+
+
 async def check_llm_health() -> bool:
     """
     Checks if the configured LLM API is reachable and responsive.
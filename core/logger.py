@@ -1,12 +1,30 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Background thread that performs the actual log I/O (stream/file writes)
+_listener: QueueListener | None = None
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def configure_logging(level: str | int = "INFO", log_file: str = "logs/app.log") -> None:
+    global _listener
+
     if isinstance(level, str):
         level = getattr(logging, level.upper(), logging.INFO)
 
-    handlers = [logging.StreamHandler()]
+    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    handlers = [stream_handler]
 
     if log_file:
         log_dir = os.path.dirname(log_file)
@@ -16,20 +34,26 @@ def configure_logging(level: str | int = "INFO", log_file: str = "logs/app.log")
         file_handler = RotatingFileHandler(
             log_file, maxBytes=10*1024*1024, backupCount=5, encoding="utf-8"
         )
-        file_handler.setFormatter(
-            logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s")
-        )
+        file_handler.setFormatter(formatter)
         handlers.append(file_handler)
 
+    # Loggers only enqueue records; a listener thread writes them, keeping
+    # blocking I/O off the event loop thread.
+    _stop_listener()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
     logging.basicConfig(
         level=level,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        handlers=handlers,
+        format="%(message)s",  # Final formatting is done by the listener's handlers
+        handlers=[QueueHandler(log_queue)],
         force=True # Reconfigure if already configured
     )
 
 
-def get_logger(name: str) -> logging.Logger:
-    return logging.getLogger(name)
+atexit.register(_stop_listener)
 
 
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
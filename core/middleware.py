@@ -1,10 +1,15 @@
 import time
 import logging
 from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
 
 logger = logging.getLogger("middleware")
 
 def add_middlewares(app: FastAPI) -> None:
+    # Compress larger bodies (persona lists, HTML pages); small JSON replies are sent as-is.
+    # Sets Vary: Accept-Encoding and only compresses when the client accepts gzip.
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
     @app.middleware("http")
     async def log_requests(request: Request, call_next):
         start_time = time.perf_counter()
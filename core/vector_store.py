@@ -1,8 +1,18 @@
+import asyncio
+from contextlib import suppress
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_postgres import PGVector
 from core.config import get_settings
 from core.database import get_database_url
+from core.logger import get_logger
+
+logger = get_logger(__name__)
 
+@lru_cache(maxsize=1)
 def get_embeddings():
     settings = get_settings()
     api_key = settings.gemini.api_key
@@ -11,7 +21,9 @@ def get_embeddings():
         google_api_key=api_key
     )
 
+@lru_cache(maxsize=8)
 def get_vector_store(collection_name: str = "chatbot_docs"):
+    # Cached per collection: each PGVector owns its own async engine and connection pool
     # Use async connection string for PGVector initialization
     connection_string = get_database_url(async_driver=True)
     
@@ -25,3 +37,88 @@ def get_vector_store(collection_name: str = "chatbot_docs"):
         create_extension=False,
         async_mode=True,
     )
+
+
+class VectorIndexQueue:
+    """
+    Background indexer for a vector store collection.
+
+    Callers enqueue documents and return immediately; a single consumer task
+    coalesces everything that arrives within `max_wait` seconds (up to
+    `max_batch` documents) into one embedding + upsert round-trip.
+    """
+
+    def __init__(self, collection_name: str, max_batch: int = 64, max_wait: float = 0.2, maxsize: int = 1000):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts the consumer task if it is not already running."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, documents: List[Document]) -> None:
+        """Enqueues documents for indexing (waits only if the queue is full)."""
+        self.start()
+        await self._queue.put(documents)
+
+    async def stop(self) -> None:
+        """Flushes pending documents and stops the consumer task."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        vector_store = None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = list(await self._queue.get())
+            taken = 1
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.extend(await asyncio.wait_for(self._queue.get(), timeout))
+                    taken += 1
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                if vector_store is None:
+                    vector_store = get_vector_store(collection_name=self.collection_name)
+                await vector_store.aadd_documents(batch)
+                logger.debug(f"Indexed {len(batch)} documents into '{self.collection_name}'")
+            except Exception as e:
+                logger.error(f"Error indexing documents into '{self.collection_name}': {e}")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+
+_index_queues: Dict[str, VectorIndexQueue] = {}
+
+
+def get_index_queue(collection_name: str = "chatbot_docs") -> VectorIndexQueue:
+    """컬렉션별 VectorIndexQueue 반환 (싱글톤)"""
+    if collection_name not in _index_queues:
+        _index_queues[collection_name] = VectorIndexQueue(collection_name)
+    return _index_queues[collection_name]
+
+
+async def stop_index_queues() -> None:
+    """대기 중인 문서를 모두 색인한 뒤 백그라운드 색인 작업 종료"""
+    for index_queue in _index_queues.values():
+        await index_queue.stop()
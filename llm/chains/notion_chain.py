@@ -1,13 +1,14 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from core.notion_client import NotionClient
+from core.notion_client import get_notion_client
 from core.llm import get_llm
+from core.cache import llm_response_cache, make_cache_key
 
 async def notion_search_chain(query: str, model_name: str = None) -> str:
     """
     Search Notion and return a summarized answer.
     """
-    client = NotionClient()
+    client = get_notion_client()
     results = await client.search(query)
     
     if not results:
@@ -15,6 +16,12 @@ async def notion_search_chain(query: str, model_name: str = None) -> str:
         
     # Format results for the LLM
     context = "\n".join([f"- [{item['title']}]({item['url']})" for item in results])
+
+    # Same query over the same search results yields the same answer
+    cache_key = make_cache_key("notion_search", model_name, query, context)
+    cached = llm_response_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     llm = get_llm(model_name)
     
@@ -33,4 +40,6 @@ async def notion_search_chain(query: str, model_name: str = None) -> str:
     
     chain = prompt | llm | StrOutputParser()
     
-    return await chain.ainvoke({"query": query, "context": context})
+    answer = await chain.ainvoke({"query": query, "context": context})
+    llm_response_cache[cache_key] = answer
+    return answer
@@ -10,6 +10,7 @@ load_dotenv(override=True)
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from core.config import get_settings
 from core.logger import configure_logging
@@ -17,9 +18,11 @@ from core.middleware import add_middlewares
 from core.exceptions import install_exception_handlers
 from api import router as api_router
 from core.database import get_engine, init_db
+from core.vector_store import get_index_queue, stop_index_queues
+from core.notion_client import close_notion_client
 
 # Routers (will be implemented in api/)
-from api.telegram_router import router as telegram_router
+from api.telegram_router import router as telegram_router, stop_chat_workers, init_bot_identity, shutdown_bot
 from api.qa_router import router as qa_router
 from api.persona_router import router as persona_router
 from api.web_router import router as web_router
@@ -30,6 +33,9 @@ async def lifespan(app: FastAPI):
     # Startup
     # Initialize database
     await init_db()
+
+    # Start background indexer for conversation history
+    get_index_queue("conversation_history").start()
     
     # Log configuration (safe)
     settings = get_settings()
@@ -40,12 +46,15 @@ async def lifespan(app: FastAPI):
     if settings.local_llm.enabled:
         logger.info(f"🚀 Hybrid Context-Aware Router: ENABLED (Prioritizing Local)")
         logger.info(f"   - Local Endpoint: {settings.local_llm.base_url}")
-        logger.info(f"   - Local Model: {settings.local_llm.model}")
+        logger.info(f"   - Local Model: {settings.local_llm.router_model or settings.local_llm.model}")
         logger.info(f"   - Fallback: Google Gemini API")
     else:
         logger.info(f"🌐 Hybrid Context-Aware Router: DISABLED (Using Cloud Only)")
         logger.info(f"   - Primary Agent: Google Gemini API")
     
+    # Resolve the bot's id/username once instead of on the first message
+    await init_bot_identity()
+
     # Set up Telegram webhook if configured
     if settings.telegram.bot_token and settings.telegram.webhook_url:
         try:
@@ -76,14 +85,23 @@ async def lifespan(app: FastAPI):
 
     
     yield
-    # Shutdown (필요시 정리 작업 추가)
+    # Shutdown
+    await stop_chat_workers()
+    await shutdown_bot()
+    await stop_index_queues()
+    await close_notion_client()
 
 
 def create_app() -> FastAPI:
     settings = get_settings()
     configure_logging(settings.log_level)
 
-    app = FastAPI(title="Chatbot AI Assistant", lifespan=lifespan, version="2.0.0")
+    app = FastAPI(
+        title="Chatbot AI Assistant",
+        lifespan=lifespan,
+        version="2.0.0",
+        default_response_class=ORJSONResponse,
+    )
 
     # Mount static files
     app.mount("/static", StaticFiles(directory="static"), name="static")
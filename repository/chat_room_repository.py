@@ -1,7 +1,8 @@
 import uuid
 from typing import Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, exists, update, Row
+from cachetools import TTLCache
 
 from core.database import get_async_session
 from models.chat_room_model import ChatRoom
@@ -98,9 +99,9 @@ class ChatRoomRepository:
         session: AsyncSession,
         chat_room_id: Union[uuid.UUID, str],
         persona_id: Optional[Union[uuid.UUID, str]] = None,
-    ) -> Optional[ChatRoom]:
+    ) -> Optional[Row]:
         """
-        채팅방에 Persona 설정
+        채팅방에 Persona 설정 (UPDATE ... RETURNING 한 번으로 처리, ORM 객체를 만들지 않음)
         
         Args:
             session: AsyncSession 인스턴스
@@ -108,20 +109,22 @@ class ChatRoomRepository:
             persona_id: Persona ID (None이면 제거, UUID 또는 UUID 문자열)
             
         Returns:
-            업데이트된 ChatRoom 인스턴스 또는 None
+            (id, persona_id) Row 또는 None (채팅방이 없는 경우)
         """
-        chat_room = await self.get_chat_room_by_id(session, chat_room_id)
-        if not chat_room:
-            return None
-        
         # 문자열인 경우 UUID로 변환
+        if isinstance(chat_room_id, str):
+            chat_room_id = uuid.UUID(chat_room_id)
         if persona_id is not None and isinstance(persona_id, str):
             persona_id = uuid.UUID(persona_id)
         
-        chat_room.persona_id = persona_id
-        await session.flush()
-        await session.refresh(chat_room)
-        return chat_room
+        stmt = (
+            update(ChatRoom)
+            .where(ChatRoom.id == chat_room_id)
+            .values(persona_id=persona_id)
+            .returning(ChatRoom.id, ChatRoom.persona_id)
+        )
+        result = await session.execute(stmt)
+        return result.one_or_none()
 
     async def update_summary(
         self,
@@ -212,6 +215,39 @@ class ChatRoomRepository:
         result = await session.execute(stmt)
         return result.scalars().all()
 
+    async def is_participant(
+        self,
+        session: AsyncSession,
+        chat_room_id: Union[uuid.UUID, str],
+        user_id: Union[uuid.UUID, str],
+    ) -> bool:
+        """
+        사용자가 채팅방 참여자인지 확인 (참여자 목록을 가져오지 않고 EXISTS로 확인)
+        
+        Args:
+            session: AsyncSession
+            chat_room_id: 채팅방 ID
+            user_id: User ID
+            
+        Returns:
+            해당 채팅방에 Conversation 기록이 있으면 True
+        """
+        from models.conversation_model import Conversation
+        
+        if isinstance(chat_room_id, str):
+            chat_room_id = uuid.UUID(chat_room_id)
+        if isinstance(user_id, str):
+            user_id = uuid.UUID(user_id)
+            
+        stmt = select(
+            exists().where(
+                Conversation.chat_room_id == chat_room_id,
+                Conversation.user_id == user_id,
+            )
+        )
+        result = await session.execute(stmt)
+        return bool(result.scalar())
+
 
 
     async def get_all_chat_rooms(
@@ -288,6 +324,19 @@ class ChatRoomRepository:
 # 싱글톤 인스턴스
 _chat_room_repository = ChatRoomRepository()
 
+# ID 조회 캐시 (그래프 실행마다 반복 조회되므로 짧은 TTL로 캐시, 변경 시 무효화)
+_chat_room_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
+
+# Telegram 채팅 ID -> (name, type, username, chat_room_id)
+# 메시지마다 반복되는 upsert에서 값이 바뀌지 않았으면 DB 쓰기를 생략
+_telegram_chat_room_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+
+def _invalidate_chat_room(chat_room_id: Union[uuid.UUID, str]) -> None:
+    """변경 후(세션 커밋 이후) 호출: 쓰기 도중 조회된 이전 값이 캐시에 남지 않도록"""
+    _chat_room_cache.pop(str(chat_room_id), None)
+
 
 async def upsert_chat_room(
     telegram_chat_id: int,
@@ -307,14 +356,25 @@ async def upsert_chat_room(
     Returns:
         생성 또는 업데이트된 ChatRoom 인스턴스
     """
+    fingerprint = (name, type, username)
+    cached = _telegram_chat_room_cache.get(telegram_chat_id)
+    if cached is not None and cached[:3] == fingerprint:
+        # 삭제된 채팅방이면 None이 반환되므로 아래 upsert로 재생성
+        chat_room = await get_chat_room_by_id(cached[3])
+        if chat_room is not None:
+            return chat_room
+
     async with get_async_session() as session:
-        return await _chat_room_repository.upsert_chat_room(
+        chat_room = await _chat_room_repository.upsert_chat_room(
             session=session,
             telegram_chat_id=telegram_chat_id,
             name=name,
             type=type,
             username=username,
         )
+    _invalidate_chat_room(chat_room.id)
+    _telegram_chat_room_cache[telegram_chat_id] = (*fingerprint, chat_room.id)
+    return chat_room
 
 
 async def get_chat_room_by_id(chat_room_id: Union[uuid.UUID, str]) -> Optional[ChatRoom]:
@@ -327,8 +387,16 @@ async def get_chat_room_by_id(chat_room_id: Union[uuid.UUID, str]) -> Optional[C
     Returns:
         ChatRoom 인스턴스 또는 None
     """
+    key = str(chat_room_id)
+    chat_room = _chat_room_cache.get(key)
+    if chat_room is not None:
+        return chat_room
+
     async with get_async_session() as session:
-        return await _chat_room_repository.get_chat_room_by_id(session, chat_room_id)
+        chat_room = await _chat_room_repository.get_chat_room_by_id(session, chat_room_id)
+    if chat_room is not None:
+        _chat_room_cache[key] = chat_room
+    return chat_room
 
 
 async def get_chat_room_by_telegram_id(telegram_chat_id: int) -> Optional[ChatRoom]:
@@ -348,7 +416,7 @@ async def get_chat_room_by_telegram_id(telegram_chat_id: int) -> Optional[ChatRo
 async def set_chat_room_persona(
     chat_room_id: Union[uuid.UUID, str],
     persona_id: Optional[Union[uuid.UUID, str]] = None,
-) -> Optional[ChatRoom]:
+) -> Optional[Row]:
     """
     채팅방에 Persona 설정 (편의 함수)
     
@@ -357,14 +425,16 @@ async def set_chat_room_persona(
         persona_id: Persona ID (None이면 제거, UUID 또는 UUID 문자열)
         
     Returns:
-        업데이트된 ChatRoom 인스턴스 또는 None
+        (id, persona_id) Row 또는 None
     """
     async with get_async_session() as session:
-        return await _chat_room_repository.set_persona(
+        result = await _chat_room_repository.set_persona(
             session=session,
             chat_room_id=chat_room_id,
             persona_id=persona_id,
         )
+    _invalidate_chat_room(chat_room_id)
+    return result
 
 
 async def update_chat_room_summary(
@@ -372,11 +442,13 @@ async def update_chat_room_summary(
     summary: str,
 ) -> Optional[ChatRoom]:
     async with get_async_session() as session:
-        return await _chat_room_repository.update_summary(
+        result = await _chat_room_repository.update_summary(
             session=session,
             chat_room_id=chat_room_id,
             summary=summary,
         )
+    _invalidate_chat_room(chat_room_id)
+    return result
 
 
 async def get_chat_room_participants(chat_room_id: Union[uuid.UUID, str]) -> list:
@@ -388,6 +460,17 @@ async def get_chat_room_participants(chat_room_id: Union[uuid.UUID, str]) -> lis
         return await _chat_room_repository.get_chat_room_participants(session, chat_room_id)
 
 
+async def is_participant(
+    chat_room_id: Union[uuid.UUID, str],
+    user_id: Union[uuid.UUID, str],
+) -> bool:
+    """
+    채팅방 참여 여부 확인 (편의 함수)
+    """
+    async with get_async_session() as session:
+        return await _chat_room_repository.is_participant(session, chat_room_id, user_id)
+
+
 async def get_user_chat_rooms(user_id: Union[uuid.UUID, str]) -> list:
     """
     사용자 채팅방 목록 조회 (편의 함수)
@@ -409,6 +492,7 @@ async def delete_chat_room(chat_room_id: Union[uuid.UUID, str]) -> bool:
     채팅방 삭제 (편의 함수)
     """
     async with get_async_session() as session:
-        return await _chat_room_repository.delete_chat_room(session, chat_room_id)
-
+        result = await _chat_room_repository.delete_chat_room(session, chat_room_id)
+    _invalidate_chat_room(chat_room_id)
+    return result
 
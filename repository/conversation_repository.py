@@ -1,7 +1,7 @@
 import uuid
-from typing import List, Tuple, Optional, Union
+from typing import Any, Dict, List, Tuple, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, insert, func
 
 from core.database import get_async_session
 from models.conversation_model import Conversation
@@ -63,6 +63,78 @@ class ConversationRepository:
         await session.refresh(conversation)
         return conversation
 
+    async def add_messages(
+        self,
+        session: AsyncSession,
+        user_id: Union[uuid.UUID, str],
+        chat_room_id: Union[uuid.UUID, str],
+        rows: List[Dict[str, Any]],
+    ) -> None:
+        """
+        여러 메시지를 단일 INSERT 문으로 추가
+
+        Args:
+            session: AsyncSession 인스턴스
+            user_id: 사용자 식별자 (UUID 또는 UUID 문자열)
+            chat_room_id: 채팅방 식별자 (UUID 또는 UUID 문자열)
+            rows: 메시지 dict 리스트 (role, message 필수 / model, input_tokens,
+                output_tokens, applied_system_prompt 선택). 전달된 순서대로 저장됨
+        """
+        if not rows:
+            return
+
+        # 문자열인 경우 UUID로 변환
+        if isinstance(user_id, str):
+            user_id = uuid.UUID(user_id)
+        if isinstance(chat_room_id, str):
+            chat_room_id = uuid.UUID(chat_room_id)
+
+        # now()는 트랜잭션 내에서 동일한 값을 반환하므로, 행 순서를 보존하기 위해
+        # 행마다 증가하는 clock_timestamp()를 사용
+        values = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "chat_room_id": chat_room_id,
+                "role": row["role"],
+                "message": row["message"],
+                "model": row.get("model"),
+                "input_tokens": row.get("input_tokens"),
+                "output_tokens": row.get("output_tokens"),
+                "applied_system_prompt": row.get("applied_system_prompt"),
+                "created_at": func.clock_timestamp(),
+            }
+            for row in rows
+        ]
+        await session.execute(insert(Conversation).values(values))
+
+    async def get_history_count(
+        self,
+        session: AsyncSession,
+        chat_room_id: Union[uuid.UUID, str],
+    ) -> int:
+        """
+        채팅방의 대화 메시지 수 조회
+
+        Args:
+            session: AsyncSession 인스턴스
+            chat_room_id: 채팅방 식별자 (UUID 또는 UUID 문자열)
+
+        Returns:
+            메시지 수
+        """
+        # 문자열인 경우 UUID로 변환
+        if isinstance(chat_room_id, str):
+            chat_room_id = uuid.UUID(chat_room_id)
+
+        stmt = (
+            select(func.count())
+            .select_from(Conversation)
+            .where(Conversation.chat_room_id == chat_room_id)
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one()
+
     async def get_history(
         self,
         session: AsyncSession,
@@ -156,6 +228,42 @@ async def add_message(
         )
 
 
+async def add_messages_batch(
+    user_id: Union[uuid.UUID, str],
+    chat_room_id: Union[uuid.UUID, str],
+    rows: List[Dict[str, Any]],
+) -> None:
+    """
+    여러 메시지를 한 번의 트랜잭션/INSERT로 추가 (편의 함수)
+
+    Args:
+        user_id: 사용자 식별자 (UUID 또는 UUID 문자열)
+        chat_room_id: 채팅방 식별자 (UUID 또는 UUID 문자열)
+        rows: 메시지 dict 리스트 (ConversationRepository.add_messages 참고)
+    """
+    async with get_async_session() as session:
+        await _conversation_repository.add_messages(
+            session=session,
+            user_id=user_id,
+            chat_room_id=chat_room_id,
+            rows=rows,
+        )
+
+
+async def get_history_count(chat_room_id: Union[uuid.UUID, str]) -> int:
+    """
+    채팅방의 대화 메시지 수 조회 (편의 함수)
+
+    Args:
+        chat_room_id: 채팅방 식별자 (UUID 또는 UUID 문자열)
+
+    Returns:
+        메시지 수
+    """
+    async with get_async_session() as session:
+        return await _conversation_repository.get_history_count(session, chat_room_id)
+
+
 async def get_history(chat_room_id: Union[uuid.UUID, str], limit: int = 20) -> List[Tuple[str, str, str, Optional[str]]]:
     """
     채팅방의 대화 이력 조회 (편의 함수)
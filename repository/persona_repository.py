@@ -2,9 +2,11 @@ import uuid
 from typing import List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_
+from cachetools import TTLCache
 
 from core.database import get_async_session
 from models.persona_model import Persona
+from models.user_model import User
 
 
 class PersonaRepository:
@@ -86,6 +88,38 @@ class PersonaRepository:
         result = await session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_persona_for_telegram_user(
+        self,
+        session: AsyncSession,
+        persona_id: Union[uuid.UUID, str],
+        telegram_id: int,
+    ) -> Optional[Persona]:
+        """
+        Telegram 사용자 기준 Persona 조회 (사용자 조회와 Persona 조회를 한 번의 쿼리로 처리)
+        
+        Args:
+            session: AsyncSession 인스턴스
+            persona_id: Persona ID (UUID 또는 UUID 문자열)
+            telegram_id: 조회하는 사용자의 Telegram ID (소유자 또는 공개 Persona만 조회 가능)
+            
+        Returns:
+            Persona 인스턴스 또는 None
+        """
+        # 문자열인 경우 UUID로 변환
+        if isinstance(persona_id, str):
+            persona_id = uuid.UUID(persona_id)
+
+        owner_id = select(User.id).where(User.telegram_id == telegram_id).scalar_subquery()
+        stmt = select(Persona).where(
+            Persona.id == persona_id,
+            or_(
+                Persona.user_id == owner_id,
+                Persona.is_public == True
+            )
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
     async def get_user_personas(
         self,
         session: AsyncSession,
@@ -264,6 +298,16 @@ class PersonaRepository:
 # 싱글톤 인스턴스
 _persona_repository = PersonaRepository()
 
+# ID 조회 캐시 (Persona는 대화 중 거의 바뀌지 않으므로 짧은 TTL로 캐시, 변경 시 무효화)
+_persona_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
+
+def _invalidate_persona(persona_id: Union[uuid.UUID, str]) -> None:
+    """변경 후(세션 커밋 이후) 호출: 쓰기 도중 조회된 이전 값이 캐시에 남지 않도록"""
+    persona_key = str(persona_id)
+    for key in [k for k in _persona_cache.keys() if k[0] == persona_key]:
+        _persona_cache.pop(key, None)
+
 
 # 편의 함수들
 async def create_persona(
@@ -290,12 +334,41 @@ async def get_persona_by_id(
     user_id: Optional[Union[uuid.UUID, str]] = None,
 ) -> Optional[Persona]:
     """Persona 조회 (편의 함수)"""
+    key = (str(persona_id), str(user_id) if user_id else None)
+    persona = _persona_cache.get(key)
+    if persona is not None:
+        return persona
+
     async with get_async_session() as session:
-        return await _persona_repository.get_persona_by_id(
+        persona = await _persona_repository.get_persona_by_id(
             session=session,
             persona_id=persona_id,
             user_id=user_id,
         )
+    if persona is not None:
+        _persona_cache[key] = persona
+    return persona
+
+
+async def get_persona_for_telegram_user(
+    persona_id: Union[uuid.UUID, str],
+    telegram_id: int,
+) -> Optional[Persona]:
+    """Telegram 사용자 기준 Persona 조회 (편의 함수)"""
+    key = (str(persona_id), f"tg:{telegram_id}")
+    persona = _persona_cache.get(key)
+    if persona is not None:
+        return persona
+
+    async with get_async_session() as session:
+        persona = await _persona_repository.get_persona_for_telegram_user(
+            session=session,
+            persona_id=persona_id,
+            telegram_id=telegram_id,
+        )
+    if persona is not None:
+        _persona_cache[key] = persona
+    return persona
 
 
 async def get_user_personas(
@@ -321,7 +394,7 @@ async def update_persona(
 ) -> Optional[Persona]:
     """Persona 수정 (편의 함수)"""
     async with get_async_session() as session:
-        return await _persona_repository.update_persona(
+        result = await _persona_repository.update_persona(
             session=session,
             persona_id=persona_id,
             user_id=user_id,
@@ -330,6 +403,8 @@ async def update_persona(
             description=description,
             is_public=is_public,
         )
+    _invalidate_persona(persona_id)
+    return result
 
 
 async def delete_persona(
@@ -338,11 +413,13 @@ async def delete_persona(
 ) -> bool:
     """Persona 삭제 (편의 함수)"""
     async with get_async_session() as session:
-        return await _persona_repository.delete_persona(
+        result = await _persona_repository.delete_persona(
             session=session,
             persona_id=persona_id,
             user_id=user_id,
         )
+    _invalidate_persona(persona_id)
+    return result
 
 
 async def get_public_personas(limit: int = 50) -> List[Persona]:
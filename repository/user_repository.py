@@ -2,6 +2,7 @@ import uuid
 from typing import Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from cachetools import TTLCache
 
 from core.database import get_async_session
 from models.user_model import User
@@ -120,6 +121,9 @@ class UserRepository:
 # 싱글톤 인스턴스
 _user_repository = UserRepository()
 
+# Telegram ID -> User 캐시 (인증된 요청마다 반복되는 조회를 줄임, upsert 시 갱신)
+_telegram_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
 
 async def upsert_user(
     email: str,
@@ -141,8 +145,16 @@ async def upsert_user(
     Returns:
         생성 또는 업데이트된 User 인스턴스
     """
+    if telegram_id:
+        # 메시지마다 호출되므로, 캐시된 사용자와 값이 같으면 DB 쓰기를 생략
+        cached = _telegram_user_cache.get(telegram_id)
+        if cached is not None and (
+            cached.email, cached.username, cached.first_name, cached.last_name
+        ) == (email, username, first_name, last_name):
+            return cached
+
     async with get_async_session() as session:
-        return await _user_repository.upsert_user(
+        user = await _user_repository.upsert_user(
             session=session,
             email=email,
             telegram_id=telegram_id,
@@ -150,6 +162,9 @@ async def upsert_user(
             first_name=first_name,
             last_name=last_name,
         )
+    if telegram_id:
+        _telegram_user_cache[telegram_id] = user
+    return user
 
 
 async def get_user_by_id(user_id: Union[uuid.UUID, str]) -> Optional[User]:
@@ -190,5 +205,12 @@ async def get_user_by_telegram_id(telegram_id: int) -> Optional[User]:
     Returns:
         User 인스턴스 또는 None
     """
+    user = _telegram_user_cache.get(telegram_id)
+    if user is not None:
+        return user
+
     async with get_async_session() as session:
-        return await _user_repository.get_user_by_telegram_id(session, telegram_id)
+        user = await _user_repository.get_user_by_telegram_id(session, telegram_id)
+    if user is not None:
+        _telegram_user_cache[telegram_id] = user
+    return user
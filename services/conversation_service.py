@@ -113,7 +113,8 @@ async def ask_question_stream(
         config = {"recursion_limit": settings.agent.recursion_limit}
         
         try:
-            stream = graph.astream(initial_state, config=config, stream_mode="updates")
+            # "messages" carries token deltas from GeneralAssistant; "updates" carries the other nodes' answers
+            stream = graph.astream(initial_state, config=config, stream_mode=["updates", "messages"])
             
             async for chunk in stream_with_buffer(stream, buffer):
                 yield chunk
@@ -162,9 +163,7 @@ async def summarize_chat_room(chat_room_id: str, user_id: str) -> str:
             return "요약할 대화 내용이 없습니다."
             
         # 대화 내용 텍스트로 변환 (오래된 순)
-        conversation_text = ""
-        for role, message, name, _ in history:
-            conversation_text += f"{name} ({role}): {message}\n"
+        conversation_text = "".join(f"{name} ({role}): {message}\n" for role, message, name, _ in history)
             
         # 요약 요청 프롬프트
         llm = get_llm("gemini-2.5-flash") # Use 2.5 flash
@@ -1,8 +1,11 @@
+import asyncio
+import base64
 import os
 import aiofiles
 import pypdf
 import pydantic_core
 from datetime import datetime
+from io import BytesIO
 from uuid import UUID
 from fastapi import UploadFile
 from sqlalchemy import select, delete
@@ -17,6 +20,9 @@ from langchain_core.output_parsers import StrOutputParser
 
 logger = get_logger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
 async def save_upload_file(file: UploadFile, chat_room_id: str) -> str:
     """Save uploaded file to disk.
 
@@ -32,12 +38,27 @@ async def save_upload_file(file: UploadFile, chat_room_id: str) -> str:
     
     file_path = os.path.join(upload_dir, file.filename)
     async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+        # Copy in chunks so large uploads are never fully held in memory
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await out_file.write(chunk)
         
     logger.info(f"File saved to: {file_path}")
     return file_path
 
+def _extract_pdf_text(file_path: str) -> str:
+    """Extract the text layer of every page (blocking; call via asyncio.to_thread)."""
+    reader = pypdf.PdfReader(file_path)
+    return "".join(ctx + "\n" for page in reader.pages if (ctx := page.extract_text()))
+
+
+def _render_page_b64(page) -> str:
+    """Render a pypdfium2 page to a base64 JPEG (blocking; call via asyncio.to_thread)."""
+    bitmap = page.render(scale=2) # 2x scale for better OCR
+    buffered = BytesIO()
+    bitmap.to_pil().save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode("ascii")
+
+
 async def process_pdf_smart(file_path: str) -> str:
     """Process PDF with Smart Ingestion logic.
 
@@ -52,13 +73,9 @@ async def process_pdf_smart(file_path: str) -> str:
     """
     text_content = ""
     
-    # 1. Try standard extraction
+    # 1. Try standard extraction (CPU-bound, so it runs off the event loop)
     try:
-        reader = pypdf.PdfReader(file_path)
-        for page in reader.pages:
-            ctx = page.extract_text()
-            if ctx:
-                text_content += ctx + "\n"
+        text_content = await asyncio.to_thread(_extract_pdf_text, file_path)
     except Exception as e:
         logger.warning(f"Standard PDF extraction failed: {e}")
 
@@ -69,7 +86,6 @@ async def process_pdf_smart(file_path: str) -> str:
         logger.info(f"PDF text content low ({len(text_content)} chars). Switching to Smart Ingestion (Vision).")
         try:
             import pypdfium2 as pdfium
-            import base64
             
             pdf = pdfium.PdfDocument(file_path)
             vision_text = []
@@ -77,15 +93,8 @@ async def process_pdf_smart(file_path: str) -> str:
             llm = get_llm("gemini-1.5-flash") # Use Flash for speed/cost
             
             for i, page in enumerate(pdf):
-                # Render page to image
-                bitmap = page.render(scale=2) # 2x scale for better OCR
-                pil_image = bitmap.to_pil()
-                
-                # Convert to base64 for Gemini
-                from io import BytesIO
-                buffered = BytesIO()
-                pil_image.save(buffered, format="JPEG")
-                img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+                # Render and encode in a worker thread; pages are handled one at a time
+                img_str = await asyncio.to_thread(_render_page_b64, page)
                 
                 # Call Gemini
                 message = HumanMessage(
@@ -176,7 +185,7 @@ async def process_uploaded_file(
         # Split text?
         from langchain_text_splitters import RecursiveCharacterTextSplitter
         splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = splitter.split_text(content)
+        chunks = await asyncio.to_thread(splitter.split_text, content)
         
         docs = [
             Document(
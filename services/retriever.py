@@ -8,6 +8,9 @@ from schemas import SearchFilters
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from core.logger import get_logger
+
+logger = get_logger(__name__)
 
 # Using OpenAI Embeddings as requested (Size 1536)
 # Ensure OPENAI_API_KEY is in .env
@@ -47,7 +50,7 @@ class RetrievalService:
         """
         # 1. Extract Filters
         filters = await self.extract_filters(user_query)
-        print(f"DEBUG: Extracted Filters: {filters}")
+        logger.debug("Extracted Filters: %s", filters)
 
         # 2. Get Query Embedding
         query_vector = await self.embeddings.aembed_query(filters.query_text)
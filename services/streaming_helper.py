@@ -4,8 +4,11 @@ Streaming helper utilities for buffering and processing LangGraph stream events.
 
 import asyncio
 import time
-from typing import Optional, AsyncIterator
-from langchain_core.messages import AIMessage, ToolMessage
+from typing import Optional, AsyncIterator, Union, Tuple, Any
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Nodes whose LLM output is forwarded token-by-token (stream_mode="messages")
+TOKEN_STREAM_NODES = frozenset({"GeneralAssistant"})
 
 class StreamBuffer:
     """
@@ -60,12 +63,24 @@ class StreamBuffer:
         return len(self.buffer) > 0
 
 
-def extract_text_from_stream_event(event: dict) -> Optional[str]:
+def _content_to_text(content) -> str:
+    """Flatten message content (str or multimodal list of dicts) to plain text."""
+    if isinstance(content, list):
+        # Handle multimodal content (list of dicts)
+        return "".join(
+            item.get("text", "") for item in content
+            if isinstance(item, dict) and item.get("type") == "text"
+        )
+    return str(content)
+
+
+def extract_text_from_stream_event(event: dict, skip_nodes: frozenset = frozenset()) -> Optional[str]:
     """
     Extract displayable text from a LangGraph stream event.
     
     Args:
         event: Stream event from graph.astream()
+        skip_nodes: Node names whose output was already streamed token-by-token
         
     Returns:
         Extracted text or None if no displayable content
@@ -74,6 +89,8 @@ def extract_text_from_stream_event(event: dict) -> Optional[str]:
     # Example: {"Researcher": {"messages": [AIMessage(...)]}}
     
     for node_name, node_output in event.items():
+        if node_name in skip_nodes:
+            continue
         if isinstance(node_output, dict) and "messages" in node_output:
             messages = node_output["messages"]
             
@@ -89,14 +106,7 @@ def extract_text_from_stream_event(event: dict) -> Optional[str]:
                     
                     # Return text content
                     if last_msg.content:
-                        if isinstance(last_msg.content, list):
-                            # Handle multimodal content (list of dicts)
-                            text_parts = []
-                            for item in last_msg.content:
-                                if isinstance(item, dict) and item.get("type") == "text":
-                                    text_parts.append(item.get("text", ""))
-                            return "".join(text_parts)
-                        return str(last_msg.content)
+                        return _content_to_text(last_msg.content)
                 
                 # Skip ToolMessage (internal tool results)
                 elif isinstance(last_msg, ToolMessage):
@@ -105,12 +115,35 @@ def extract_text_from_stream_event(event: dict) -> Optional[str]:
     return None
 
 
+def extract_token_from_message_event(data: Tuple[Any, dict]) -> Optional[Tuple[str, str]]:
+    """
+    Extract a token delta from a stream_mode="messages" event.
+
+    Args:
+        data: (message_chunk, metadata) pair emitted by graph.astream()
+
+    Returns:
+        (node_name, text) for token chunks from TOKEN_STREAM_NODES, else None
+    """
+    chunk, metadata = data
+    node_name = metadata.get("langgraph_node")
+    if node_name not in TOKEN_STREAM_NODES or not isinstance(chunk, AIMessageChunk):
+        return None
+    text = _content_to_text(chunk.content) if chunk.content else ""
+    return (node_name, text) if text else None
+
+
 async def stream_with_buffer(
-    stream: AsyncIterator[dict],
+    stream: AsyncIterator[Union[dict, Tuple[str, Any]]],
     buffer: StreamBuffer
 ) -> AsyncIterator[str]:
     """
     Process a LangGraph stream with buffering.
+
+    Accepts either a plain "updates" stream or a multi-mode
+    ["updates", "messages"] stream. In the latter case token deltas from
+    TOKEN_STREAM_NODES are forwarded as they arrive and the node's final
+    update is skipped so the answer is not sent twice.
     
     Args:
         stream: Async iterator from graph.astream()
@@ -119,9 +152,25 @@ async def stream_with_buffer(
     Yields:
         Buffered text chunks ready to send
     """
-    async for event in stream:
-        # Extract text from event
-        text = extract_text_from_stream_event(event)
+    # Nodes that streamed tokens since their last "updates" event
+    streamed_nodes = set()
+
+    async for item in stream:
+        if isinstance(item, tuple):
+            mode, data = item
+            if mode == "messages":
+                token = extract_token_from_message_event(data)
+                if token is None:
+                    continue
+                node_name, text = token
+                streamed_nodes.add(node_name)
+            else:
+                skip_nodes = frozenset(streamed_nodes & data.keys())
+                streamed_nodes -= skip_nodes
+                text = extract_text_from_stream_event(data, skip_nodes)
+        else:
+            # Extract text from event
+            text = extract_text_from_stream_event(item)
         
         if text:
             # Add to buffer and check if we should flush
@@ -1,8 +1,10 @@
+from functools import lru_cache
 from langchain_core.tools import Tool
 from langchain_core.documents import Document
 from core.vector_store import get_vector_store
 from typing import List
 
+@lru_cache(maxsize=1)
 def get_memory_tool():
     """
     Returns a tool that retrieves information from the conversation history.
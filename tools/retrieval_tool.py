@@ -1,3 +1,4 @@
+from functools import lru_cache
 from langchain_core.tools import Tool
 from langchain_core.documents import Document
 from core.vector_store import get_vector_store
@@ -6,6 +7,7 @@ from core.logger import get_logger
 
 logger = get_logger(__name__)
 
+@lru_cache(maxsize=256)
 def get_retrieval_tool(chat_room_id: str = None):
     """
     Returns a tool that retrieves information from the vector store.
@@ -1,8 +1,10 @@
 import os
+from functools import lru_cache
 from langchain_tavily import TavilySearch
 from langchain_core.tools import Tool
 from core.config import get_settings
 
+@lru_cache(maxsize=1)
 def get_search_tool():
     """
     Tavily Search Tool을 반환합니다.
@@ -1,10 +1,12 @@
 from datetime import datetime
+from functools import lru_cache
 from langchain_core.tools import Tool
 
 def get_current_time(query: str = "") -> str:
     """Returns the current local time."""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+@lru_cache(maxsize=1)
 def get_time_tool():
     """
     Returns a tool that provides the current time.